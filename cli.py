@@ -0,0 +1,254 @@
+"""Headless export of QGIS projects into map projects.
+
+Run from the directory containing the plugin, e.g. the QGIS plugins
+directory:
+
+    python3 -m qgis_open_layers_map.cli project.qgz -o ~/maps/project
+    python3 -m qgis_open_layers_map.cli *.qgz -o ~/maps --workers 4
+
+With several projects, each one is exported into a directory named after
+the project file inside the output directory.
+"""
+from qgis.core import (
+    QgsApplication,
+    QgsCoordinateTransform,
+    QgsProject,
+    QgsRectangle,
+)
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Optional, Sequence
+import argparse
+import logging
+import os
+import sys
+from . import project_initializer
+from .export_manifest import format_size
+from .export_task import create_project_exporter, run_export
+from .view_exporter import StaticViewport
+
+DEFAULT_WIDTH = 1280
+
+Extent = tuple[float, float, float, float]
+
+application: Optional[QgsApplication] = None
+
+
+def init_qgis() -> None:
+    """Starts QGIS without GUI, once per process."""
+    global application
+    if application is not None:
+        return
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    application = QgsApplication([], False)
+    application.initQgis()
+
+
+def parse_extent(value: str) -> Extent:
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise argparse.ArgumentTypeError("expected xmin,ymin,xmax,ymax")
+    try:
+        return tuple(float(part) for part in parts)
+    except ValueError as ex:
+        raise argparse.ArgumentTypeError(str(ex))
+
+
+def saved_canvas_extent(document) -> Optional[QgsRectangle]:
+    """Extent of the main map canvas stored in a project file."""
+    canvases = document.elementsByTagName("mapcanvas")
+    for i in range(canvases.count()):
+        canvas = canvases.at(i).toElement()
+        if canvas.attribute("name") != "theMapCanvas":
+            continue
+        extent = canvas.firstChildElement("extent")
+        if extent.isNull():
+            return None
+        return QgsRectangle(
+            *(float(extent.firstChildElement(name).text()) for name in ("xmin", "ymin", "xmax", "ymax"))
+        )
+    return None
+
+
+def default_extent(qgis_instance: QgsProject, saved_extent: Optional[QgsRectangle]) -> QgsRectangle:
+    """Initial map extent of a project, in the project CRS.
+
+    The default view extent from the project properties wins over the
+    extent the project was saved with, the full extent of all layers is
+    the last resort.
+    """
+    view_settings = qgis_instance.viewSettings()
+    extent = view_settings.defaultViewExtent()
+    if not extent.isNull():
+        if extent.crs() == qgis_instance.crs():
+            return QgsRectangle(extent)
+        transform = QgsCoordinateTransform(extent.crs(), qgis_instance.crs(), qgis_instance)
+        return transform.transformBoundingBox(extent)
+
+    if saved_extent is not None and not saved_extent.isEmpty():
+        return saved_extent
+
+    return QgsRectangle(view_settings.fullExtent())
+
+
+def read_project(project_file: str) -> tuple[QgsProject, Optional[QgsRectangle]]:
+    qgis_instance = QgsProject()
+    saved_extents = []
+    qgis_instance.readProject.connect(lambda document: saved_extents.append(saved_canvas_extent(document)))
+    if not qgis_instance.read(project_file):
+        raise RuntimeError(f"Cannot read {project_file}: {qgis_instance.error()}")
+    return qgis_instance, next(iter(saved_extents), None)
+
+
+def export_project_file(
+    project_file: str,
+    project_dir_path: str,
+    extent: Optional[Extent] = None,
+    scale: Optional[float] = None,
+    width: int = DEFAULT_WIDTH,
+    template: Optional[project_initializer.TemplateSource] = None,
+) -> dict[str, Any]:
+    """Exports a QGIS project file into a map project.
+
+    Returns the export statistics. Runs in pool workers, so arguments and
+    result are plain picklable values.
+    """
+    check_project_dir(project_dir_path)
+    init_qgis()
+    qgis_instance, saved_extent = read_project(project_file)
+
+    map_extent = QgsRectangle(*extent) if extent is not None else default_extent(qgis_instance, saved_extent)
+    if scale is not None:
+        viewport = StaticViewport(map_extent, scale)
+    else:
+        viewport = StaticViewport.fit(qgis_instance, map_extent, width)
+
+    exporter = create_project_exporter(qgis_instance, viewport, project_dir_path)
+    stats = run_export(exporter, exporter.snapshot(), project_dir_path, template=template)
+    return stats.to_dict()
+
+
+def project_dirs(project_files: Sequence[str], output: str) -> list[str]:
+    if len(project_files) == 1:
+        return [output]
+
+    names = [Path(project_file).stem for project_file in project_files]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Several projects would be exported to {', '.join(duplicates)}")
+    return [os.path.join(output, name) for name in names]
+
+
+def check_project_dir(project_dir_path: str) -> None:
+    os.makedirs(project_dir_path, exist_ok=True)
+    if not (project_initializer.is_project(project_dir_path) or project_initializer.is_empty(project_dir_path)):
+        raise ValueError(
+            f"{project_dir_path} is neither a QGIS OpenLayers Map project nor an empty directory"
+        )
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="qgis_open_layers_map.cli",
+        description="Exports QGIS projects into QGIS OpenLayers Map projects without QGIS desktop.",
+    )
+    parser.add_argument("projects", nargs="+", metavar="PROJECT", help=".qgs or .qgz project file")
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="map project directory, with several projects the directory to create them in",
+    )
+    parser.add_argument(
+        "--extent",
+        type=parse_extent,
+        help="initial map extent xmin,ymin,xmax,ymax in the project CRS, "
+        "defaults to the project's default view or saved extent",
+    )
+    parser.add_argument("--scale", type=float, help="initial map scale denominator, defaults to fit the extent")
+    parser.add_argument(
+        "--width",
+        type=int,
+        default=DEFAULT_WIDTH,
+        help=f"map width in pixels the extent is fitted to (default {DEFAULT_WIDTH})",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=1,
+        help="number of projects exported in parallel, each in its own process",
+    )
+    parser.add_argument(
+        "--template",
+        help="template zip used for new map projects, instead of the latest release from GitHub",
+    )
+    parser.add_argument("--template-cache", help="directory caching the downloaded template")
+    parser.add_argument(
+        "--template-max-age",
+        type=float,
+        help="seconds a cached template is used without checking for a newer release",
+    )
+    return parser.parse_args(argv)
+
+
+def template_source(args: argparse.Namespace) -> project_initializer.TemplateSource:
+    source = project_initializer.TemplateSource.from_env()
+    if args.template is not None:
+        source.template_zip = args.template
+    if args.template_cache is not None:
+        source.cache_dir = args.template_cache
+    if args.template_max_age is not None:
+        source.max_age = args.template_max_age
+    return source
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    try:
+        targets = project_dirs(args.projects, args.output)
+    except ValueError as ex:
+        print(ex, file=sys.stderr)
+        return 2
+
+    template = template_source(args)
+    results: dict[str, Future] = {}
+    executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_qgis) if args.workers > 1 else None
+    try:
+        for project_file, project_dir_path in zip(args.projects, targets):
+            job = (project_file, project_dir_path, args.extent, args.scale, args.width, template)
+            if executor is not None:
+                future = executor.submit(export_project_file, *job)
+            else:
+                future = Future()
+                try:
+                    future.set_result(export_project_file(*job))
+                except Exception as ex:
+                    future.set_exception(ex)
+            results[project_file] = future
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    failed = 0
+    for project_file, future in results.items():
+        try:
+            stats = future.result()
+        except Exception as ex:
+            failed += 1
+            print(f"{project_file}: export failed: {ex}", file=sys.stderr)
+            continue
+        print(
+            f"{project_file}: copied {stats['copied_files']} files ({format_size(stats['copied_bytes'])}), "
+            f"skipped {stats['skipped_files']} unchanged files ({format_size(stats['skipped_bytes'])})"
+        )
+
+    if application is not None:
+        application.exitQgis()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator
+import gzip
+import logging
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 1024 * 1024
+
+SIDECAR_SUFFIXES = {
+    "gzip": ".gz",
+    "brotli": ".br",
+}
+
+# already compressed formats (images, GeoTIFF) gain nothing
+COMPRESSIBLE_SUFFIXES = {
+    ".csv",
+    ".geojson",
+    ".gpx",
+    ".js",
+    ".json",
+    ".kml",
+    ".pbf",
+    ".svg",
+    ".ts",
+    ".xml",
+}
+
+
+def compress_gzip(source: Path, target: Path) -> None:
+    # a fixed mtime in the header keeps the output reproducible
+    with source.open("rb") as source_fp, gzip.GzipFile(target, "wb", compresslevel=9, mtime=0) as target_fp:
+        shutil.copyfileobj(source_fp, target_fp, BUFFER_SIZE)
+
+
+def compress_brotli(source: Path, target: Path) -> None:
+    compressor = brotli.Compressor(quality=11)
+    with source.open("rb") as source_fp, target.open("wb") as target_fp:
+        while chunk := source_fp.read(BUFFER_SIZE):
+            target_fp.write(compressor.process(chunk))
+        target_fp.write(compressor.finish())
+
+
+COMPRESSORS = {
+    "gzip": compress_gzip,
+    "brotli": compress_brotli,
+}
+
+
+def write_sidecar(source: Path, method: str) -> bool:
+    """Writes a compressed copy of source next to it, e.g. data.geojson.gz.
+
+    The sidecar gets the modification time of its source, which is how an
+    up to date sidecar is recognized and skipped. Returns whether the
+    sidecar was written.
+    """
+    sidecar = source.with_name(source.name + SIDECAR_SUFFIXES[method])
+    stat = source.stat()
+    if sidecar.exists() and sidecar.stat().st_mtime_ns == stat.st_mtime_ns:
+        return False
+
+    tmp_path = sidecar.with_name(sidecar.name + ".tmp")
+    try:
+        COMPRESSORS[method](source, tmp_path)
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp_path, sidecar)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return True
+
+
+def iter_compressible(paths: Iterable[Path]) -> Iterator[Path]:
+    for path in paths:
+        files = path.rglob("*") if path.is_dir() else [path]
+        for file_path in files:
+            if file_path.suffix.lower() in COMPRESSIBLE_SUFFIXES and file_path.is_file():
+                yield file_path
+
+
+def write_sidecars(paths: Iterable[Path], methods: Iterable[str], workers: int) -> int:
+    """Writes compressed sidecars of the compressible files among paths.
+
+    Directories are searched recursively. zlib and brotli release the GIL
+    while compressing, so the thread pool compresses on all workers
+    concurrently. Returns the number of sidecars written.
+    """
+    methods = list(methods)
+    if "brotli" in methods and brotli is None:
+        logger.warning("brotli module is not installed, skipping .br sidecars")
+        methods.remove("brotli")
+
+    jobs = [(path, method) for path in iter_compressible(paths) for method in methods]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return sum(executor.map(lambda job: write_sidecar(*job), jobs))
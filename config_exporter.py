@@ -8,43 +8,156 @@ from qgis.core import (
     QgsProject,
 )
 from qgis.gui import QgsMapCanvas
-from typing import Any
+from typing import Any, Callable, Iterator, Optional
 from pathlib import Path
-import json
+from .compression import write_sidecars
+from .config_writer import StreamedObject, write_config
 from .layer_exporter import LayerExporter
-from .data_exporter import DataExporter
+from .data_exporter import CancelCallback, DataExporter, ProgressCallback
+from .export_manifest import ExportManifest, ExportStats
+from .export_options import ExportOptions
+from .profiler import Profiler, path_size
 from itertools import count
-from .view_exporter import export_viewport
+from .view_exporter import export_viewport, extract_extent
 
 JsonDict = dict[str, Any]
 
+# proj4 strings by authid, kept across exports
+proj4_cache: dict[str, str] = {}
+
+# projections OpenLayers knows without proj4 definitions
+WEB_CRSES = {"EPSG:3857", "EPSG:4326"}
+
 
 class ProjectExporter:
-    def __init__(self, root: QgsLayerTree, qgis_instance: QgsProject, map_canvas: QgsMapCanvas, target_path: str, data_dir_path: str) -> None:
+    def __init__(
+        self,
+        root: QgsLayerTree,
+        qgis_instance: QgsProject,
+        map_canvas: QgsMapCanvas,
+        target_path: str,
+        data_dir_path: str,
+        options: Optional[ExportOptions] = None,
+        manifest_path: Optional[str] = None,
+    ) -> None:
         self.root = root
         self.counter = count()
-        self.layer_exporter = LayerExporter(root, self.counter, DataExporter(data_dir_path))
+        self.options = options or ExportOptions()
+        self.manifest = (
+            ExportManifest(manifest_path, use_hash=self.options.manifest_hash)
+            if manifest_path and self.options.incremental
+            else None
+        )
+        self.profiler = Profiler()
+        self.data_exporter = DataExporter(data_dir_path, self.options, self.manifest, self.profiler)
+        self.layer_exporter = LayerExporter(root, self.counter, self.data_exporter)
         self.target_path = target_path
         self.qgis_instance = qgis_instance
         self.map_canvas = map_canvas
 
-    def export(self):
-        data = self.to_dict()
-        path = Path(self.target_path)
-        with path.open("w") as f:
-            f.write("export default ")
-            json.dump(data, f, indent=4)
-            f.write(";\n")
+    def export(self) -> ExportStats:
+        return self.write(self.snapshot())
 
     def to_dict(self) -> JsonDict:
+        return self.resolve(self.snapshot())
+
+    def snapshot(self) -> JsonDict:
+        """Reads the layer tree, styles and viewport.
+
+        Touches QGIS objects, so it has to run on the main thread. Exported
+        data files are represented by futures until resolve() is called.
+        """
+        profiler = self.profiler
+        with profiler.phase("layer_order"):
+            self.layer_exporter.index_layer_order()
+
+        with profiler.phase("viewport"):
+            if self.options.wms_tiles or (self.options.export_features and self.options.feature_extent_filter):
+                self.layer_exporter.view_extent = extract_extent(self.qgis_instance, self.map_canvas)
+            viewport = export_viewport(self.qgis_instance, self.map_canvas)
+
+        with profiler.phase("layer_tree"):
+            layers = self.children_to_dict(self.root.children())
+
+        with profiler.phase("epsgs"):
+            crses = [layerNode.layer().crs() for layerNode in self.root.findLayers()]
+            if self.options.target_crs:
+                # only layers left in another CRS are reprojected in the browser
+                used = set(self.layer_crses(layers)) - WEB_CRSES
+                crses = [crs for crs in crses if crs.authid() in used]
+            epsgs = self.epsgs_to_dict(crses)
+
         return {
-            "epsgs": self.epsgs_to_dict(
-                [layerNode.layer().crs() for layerNode in self.root.findLayers()]
-            ),
-            "viewport": export_viewport(self.qgis_instance, self.map_canvas),
-            "layers": self.children_to_dict(self.root.children()),
+            **({"epsgs": epsgs} if epsgs or not self.options.target_crs else {}),
+            "viewport": viewport,
+            "layers": layers,
         }
 
+    def resolve(
+        self,
+        data: JsonDict,
+        progress: Optional[ProgressCallback] = None,
+        is_canceled: Optional[CancelCallback] = None,
+    ) -> JsonDict:
+        """Exports the data files of a snapshot. Safe to run in a background thread."""
+        with self.profiler.phase("jobs"):
+            self.data_exporter.run_jobs(progress, is_canceled)
+        return {**data, "layers": self.resolve_children(data["layers"])}
+
+    def write(
+        self,
+        data: JsonDict,
+        progress: Optional[ProgressCallback] = None,
+        is_canceled: Optional[CancelCallback] = None,
+    ) -> ExportStats:
+        """Exports the data files and streams the configuration to target_path.
+
+        Layers are resolved one at a time while they are being written.
+        progress receives the percentage of finished data jobs and written
+        layers, so that layers without data files (XYZ, WMS, WFS) move it too.
+        """
+        profiler = self.profiler
+        num_jobs = self.data_exporter.num_jobs()
+        num_steps = max(1, num_jobs + self.count_layers(data["layers"]))
+        written = count(num_jobs + 1)
+
+        def job_progress(percent: float) -> None:
+            if progress is not None:
+                progress(percent * num_jobs / num_steps)
+
+        def layer_written() -> None:
+            if progress is not None:
+                progress(100 * next(written) / num_steps)
+
+        with profiler.phase("jobs"):
+            self.data_exporter.run_jobs(job_progress, is_canceled)
+
+        with profiler.phase("config"):
+            layers = self.stream_children(data["layers"], layer_written)
+            streamed = StreamedObject({**data, "layers": layers}.items())
+            write_config(self.target_path, streamed, compact=self.options.compact_config)
+        if profiler.enabled:
+            profiler.add_bytes("config", path_size(Path(self.target_path)))
+
+        if self.options.precompress:
+            with profiler.phase("sidecars"):
+                write_sidecars(
+                    [Path(self.target_path), *self.data_exporter.outputs()],
+                    self.options.precompress,
+                    self.options.worker_count,
+                )
+
+        if self.options.content_hash_names:
+            self.data_exporter.remove_stale_outputs()
+
+        if self.manifest is not None:
+            with profiler.phase("manifest"):
+                self.manifest.save()
+
+        if progress is not None:
+            progress(100)
+        return self.data_exporter.stats
+
     def layer_to_dict(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
         return self.layer_exporter.layer_to_dict(layerNode)
 
@@ -68,10 +181,61 @@ class ProjectExporter:
     def children_to_dict(self, children: list[QgsLayerTreeNode]) -> dict[str, JsonDict]:
         return dict(self._child_to_id_and_dict(child) for child in children)
 
+    def resolve_children(self, children: dict[str, JsonDict]) -> dict[str, JsonDict]:
+        return {child_id: self.resolve_child(child) for child_id, child in children.items()}
+
+    def resolve_child(self, child: JsonDict) -> JsonDict:
+        if child["type"] == "group":
+            return {**child, "layers": self.resolve_children(child["layers"])}
+        return self.layer_exporter.resolve_layer(child)
+
+    def stream_children(
+        self, children: dict[str, JsonDict], layer_written: Optional[Callable[[], None]] = None
+    ) -> StreamedObject:
+        return StreamedObject(
+            (child_id, self.stream_child(child, layer_written)) for child_id, child in children.items()
+        )
+
+    def stream_child(self, child: JsonDict, layer_written: Optional[Callable[[], None]] = None) -> Any:
+        if child["type"] == "group":
+            layers = self.stream_children(child["layers"], layer_written)
+            return StreamedObject({**child, "layers": layers}.items())
+        layer = self.layer_exporter.resolve_layer(child)
+        if layer_written is not None:
+            layer_written()
+        return layer
+
+    def count_layers(self, children: dict[str, JsonDict]) -> int:
+        return sum(
+            self.count_layers(child["layers"]) if child["type"] == "group" else 1
+            for child in children.values()
+        )
+
+    def layer_crses(self, children: dict[str, JsonDict]) -> Iterator[str]:
+        """CRSs of the exported layers, as written to their configuration."""
+        for child in children.values():
+            if child["type"] == "group":
+                yield from self.layer_crses(child["layers"])
+            else:
+                yield child.get("crs", "")
+
     def epsgs_to_dict(
         self, epsgs: list[QgsCoordinateReferenceSystem]
     ) -> dict[str, str]:
-        return {epsg.authid(): self.epsg_to_str(epsg) for epsg in epsgs}
+        # layers mostly share a handful of CRSs, each is converted once
+        unique: dict[str, QgsCoordinateReferenceSystem] = {}
+        for epsg in epsgs:
+            unique.setdefault(epsg.authid(), epsg)
+        return {authid: self.cached_epsg_to_str(authid, epsg) for authid, epsg in unique.items()}
+
+    def cached_epsg_to_str(self, authid: str, epsg: QgsCoordinateReferenceSystem) -> str:
+        # user defined CRSs can be edited, and are not cached
+        if not authid or authid.upper().startswith("USER:"):
+            return self.epsg_to_str(epsg)
+        proj4_str = proj4_cache.get(authid)
+        if proj4_str is None:
+            proj4_str = proj4_cache[authid] = self.epsg_to_str(epsg)
+        return proj4_str
 
     def epsg_to_str(self, epsg: QgsCoordinateReferenceSystem) -> str:
         proj4_str = epsg.toProj4()
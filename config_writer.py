@@ -0,0 +1,80 @@
+from pathlib import Path
+from typing import Any, Iterable, Optional, TextIO
+import json
+import os
+
+INDENT = 4
+
+
+class StreamedObject:
+    """JSON object whose (key, value) pairs are produced while it is written."""
+
+    def __init__(self, items: Iterable[tuple[str, Any]]) -> None:
+        self.items = items
+
+
+class JsonStreamWriter:
+    """Writes JSON incrementally.
+
+    Plain values are serialized with json.dumps as soon as they are reached,
+    StreamedObject values are written item by item, so that the whole
+    document never needs to exist in memory. The indented output is the same
+    as json.dump(..., indent=4) would produce.
+    """
+
+    def __init__(self, fp: TextIO, compact: bool = False) -> None:
+        self.fp = fp
+        self.indent: Optional[int] = None if compact else INDENT
+        self.item_separator = ","
+        self.key_separator = ":" if compact else ": "
+
+    def newline(self, level: int) -> str:
+        if self.indent is None:
+            return ""
+        return "\n" + " " * (self.indent * level)
+
+    def dumps(self, value: Any, level: int) -> str:
+        text = json.dumps(value, indent=self.indent, separators=(self.item_separator, self.key_separator))
+        if self.indent is None:
+            return text
+        # serialized strings never contain a raw newline, only nested levels do
+        return text.replace("\n", self.newline(level))
+
+    def write(self, value: Any, level: int = 0) -> None:
+        if isinstance(value, StreamedObject):
+            self.write_object(value, level)
+        else:
+            self.fp.write(self.dumps(value, level))
+
+    def write_object(self, value: StreamedObject, level: int) -> None:
+        self.fp.write("{")
+        empty = True
+        for key, item in value.items:
+            if not empty:
+                self.fp.write(",")
+            self.fp.write(self.newline(level + 1))
+            self.fp.write(json.dumps(key) + self.key_separator)
+            self.write(item, level + 1)
+            empty = False
+        if not empty:
+            self.fp.write(self.newline(level))
+        self.fp.write("}")
+
+
+def write_config(path: str, data: Any, compact: bool = False) -> None:
+    """Writes config.ts through a temporary file, replaced atomically.
+
+    A web server never sees a half written configuration, even when the
+    export fails or is canceled midway.
+    """
+    target = Path(path)
+    tmp_path = target.with_name(target.name + ".tmp")
+    try:
+        with tmp_path.open("w") as fp:
+            fp.write("export default ")
+            JsonStreamWriter(fp, compact).write(data)
+            fp.write(";\n")
+        os.replace(tmp_path, target)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
@@ -1,22 +1,326 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from itertools import count
 from pathlib import Path
+from typing import Any, Callable, Optional, Union
+from .compression import SIDECAR_SUFFIXES
+from .export_manifest import ExportManifest, ExportStats, hash_file
+from .export_options import ExportOptions
+from .profiler import Profiler
+import errno
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger(__name__)
+
+# copy_file_range() is attempted in chunks of this size, so that a huge file
+# never requires a single multi-gigabyte syscall
+KERNEL_COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+# hex digits of the content hash in data/<hash>.<ext>
+HASHED_NAME_LENGTH = 16
+
+UNSUPPORTED_KERNEL_COPY_ERRORS = (
+    errno.ENOSYS,
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOTSUP,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+)
+
+
+def _copy_file_range(source: Path, target: Path) -> bool:
+    """Copies with copy_file_range(2), which reflinks on CoW filesystems.
+
+    Returns False when the kernel or the filesystem does not support it.
+    """
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    with source.open("rb") as source_fp, target.open("wb") as target_fp:
+        source_fd = source_fp.fileno()
+        target_fd = target_fp.fileno()
+        copied = 0
+        while True:
+            try:
+                sent = os.copy_file_range(source_fd, target_fd, KERNEL_COPY_CHUNK_SIZE)
+            except OSError as ex:
+                if copied == 0 and ex.errno in UNSUPPORTED_KERNEL_COPY_ERRORS:
+                    return False
+                raise
+            if sent == 0:
+                return True
+            copied += sent
+
+
+def copy_file(source: Path, target: Path) -> None:
+    """Copies a file without ever holding more than a small buffer in memory.
+
+    copy_file_range is tried first; shutil.copyfile then takes care of
+    sendfile/fcopyfile and falls back to a bounded buffered copy.
+    """
+    if _copy_file_range(source, target):
+        return
+    shutil.copyfile(source, target)
+
+
+def link_file(source: Path, target: Path, link_mode: str) -> bool:
+    """Links target to source instead of copying it.
+
+    Returns False when the link mode is "copy" or when linking is not
+    possible, in which case the caller should copy the file.
+    """
+    if link_mode == "copy":
+        return False
+
+    if source.stat().st_dev != target.parent.stat().st_dev:
+        logger.info("%s is on another filesystem, copying instead of linking", source)
+        return False
+
+    try:
+        if link_mode == "hardlink":
+            os.link(source, target)
+        else:
+            os.symlink(source.resolve(), target)
+    except OSError:
+        logger.warning("Cannot %s %s, copying instead", link_mode, source, exc_info=True)
+        return False
+
+    return True
+
+
+Job = tuple[Future, Callable[[], str]]
+ProgressCallback = Callable[[float], None]
+CancelCallback = Callable[[], bool]
+
+
+class ExportCanceled(Exception):
+    pass
+
+
+def run_job(job: Job) -> None:
+    future, func = job
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        future.set_result(func())
+    except Exception as ex:
+        future.set_exception(ex)
 
 
 class DataExporter:
-    def __init__(self, data_dir_path: str) -> None:
+    """Exports local data files referenced by layers into the data directory.
+
+    Exporting is deferred: process_url() only schedules a job and returns a
+    future of the URL under which the file will be served. The jobs are
+    executed by run_jobs(), sequentially or on a bounded thread pool.
+    """
+
+    def __init__(
+        self,
+        data_dir_path: str,
+        options: Optional[ExportOptions] = None,
+        manifest: Optional[ExportManifest] = None,
+        profiler: Optional[Profiler] = None,
+    ) -> None:
         self.data_dir_path = data_dir_path
+        self.options = options or ExportOptions()
+        self.manifest = manifest
+        self.profiler = profiler or Profiler()
+        self.stats = ExportStats()
+        self.jobs: list[Job] = []
+        self.scheduled: dict[str, tuple[Union[Path, str], Future]] = {}
+        self.hashed_names: set[str] = set()
+        self.hashed_outputs: list[Path] = []
+        self.lock = threading.Lock()
+        self.is_canceled: Optional[CancelCallback] = None
 
-    def process_url(self, url: str) -> str:
+    def process_url(self, url: str) -> Union[str, Future]:
         if not self.is_local_file(url):
             return url
 
         source = Path(url)
+        if self.options.content_hash_names:
+            return self.schedule(source, source, partial(self.export_hashed_file, source))
+
         target = Path(self.data_dir_path) / source.name
 
-        with source.open("rb") as source_fp:
-            with target.open("wb") as target_fp:
-                target_fp.write(source_fp.read())
+        return self.export_data(
+            source, target, "./data/" + source.name, self.write_file, link_mode=self.options.link_mode
+        )
+
+    def export_hashed_file(self, source: Path) -> str:
+        """Exports source as data/<hash>.<ext>.
+
+        Sources with identical content end up in a single file, written once.
+        """
+        digest = self.content_hash(source)
+        name = f"{digest[:HASHED_NAME_LENGTH]}{source.suffix}"
+        url = "./data/" + name
+
+        with self.lock:
+            if name in self.hashed_names:
+                return url
+            self.hashed_names.add(name)
+
+        settings = {"link_mode": self.options.link_mode, "hash": digest}
+        target = self.data_path(name)
+        self.export_if_changed(source, target, url, self.write_file, settings)
+        with self.lock:
+            self.hashed_outputs.append(target)
+        return url
+
+    def content_hash(self, source: Path) -> str:
+        if self.manifest is not None:
+            cached = self.manifest.cached_hash(source)
+            if cached is not None:
+                return cached
+        return hash_file(source)
+
+    def remove_stale_outputs(self) -> None:
+        """Removes files written by the previous export but not by this one."""
+        if self.manifest is None:
+            return
+        for key in self.manifest.stale_keys():
+            path = self.data_path(key)
+            # precompressed sidecars go together with their file
+            for stale in [path, *(path.with_name(path.name + suffix) for suffix in SIDECAR_SUFFIXES.values())]:
+                if stale.is_file() or stale.is_symlink():
+                    stale.unlink()
+
+    def outputs(self) -> list[Path]:
+        """Files and directories in the data directory successfully written by the finished jobs."""
+        with self.lock:
+            scheduled = list(self.scheduled.items())
+            hashed_outputs = list(self.hashed_outputs)
+        data_dir = Path(self.data_dir_path).absolute()
+        # hashed files are scheduled under their source, their target is
+        # only known once they are written
+        targets = [
+            Path(target)
+            for target, (_, future) in scheduled
+            if future.done() and not future.cancelled() and future.exception() is None
+        ]
+        return [path for path in targets + hashed_outputs if path.absolute().is_relative_to(data_dir)]
+
+    def export_data(
+        self,
+        source: Path,
+        target: Path,
+        url: str,
+        write: Callable[[Path, Path], None],
+        **settings: Any,
+    ) -> Future:
+        """Schedules write(source, target), producing data served under url.
+
+        target may be a file or a directory. The job is skipped when the
+        manifest says target was already made from the same source with the
+        same settings.
+        """
+        return self.schedule(source, target, partial(self.export_if_changed, source, target, url, write, settings))
+
+    def data_path(self, *parts: str) -> Path:
+        return Path(self.data_dir_path).joinpath(*parts)
+
+    def schedule(self, source: Union[Path, str], target: Path, func: Callable[[], str]) -> Future:
+        """Schedules a job producing target from source, once per target."""
+        key = str(target)
+        with self.lock:
+            if key in self.scheduled:
+                scheduled_source, future = self.scheduled[key]
+                if scheduled_source != source:
+                    logger.warning("%s and %s are both exported as %s, keeping the former", scheduled_source, source, target)
+                return future
+
+            new_future: Future = Future()
+            self.scheduled[key] = (source, new_future)
+            self.jobs.append((new_future, self.profiler.bind("data", target, func)))
+            return new_future
+
+    def run_jobs(
+        self,
+        progress: Optional[ProgressCallback] = None,
+        is_canceled: Optional[CancelCallback] = None,
+    ) -> None:
+        """Runs the scheduled jobs.
+
+        progress receives the percentage of finished jobs. Once is_canceled
+        returns True the remaining jobs are canceled and ExportCanceled is
+        raised.
+        """
+        with self.lock:
+            jobs, self.jobs = self.jobs, []
+        self.is_canceled = is_canceled
+
+        finished = count(1)
+
+        def run(job: Job) -> None:
+            if is_canceled is not None and is_canceled():
+                job[0].cancel()
+            run_job(job)
+            if progress is not None:
+                progress(100 * next(finished) / len(jobs))
+
+        workers = self.options.worker_count
+        if workers <= 1 or len(jobs) <= 1:
+            for job in jobs:
+                run(job)
+        else:
+            with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+                for _ in executor.map(run, jobs):
+                    pass
+
+        if is_canceled is not None and is_canceled():
+            raise ExportCanceled()
+
+    def num_jobs(self) -> int:
+        """Number of jobs scheduled and not run yet."""
+        with self.lock:
+            return len(self.jobs)
+
+    def canceled(self) -> bool:
+        """Tells long running jobs whether the export they run in was canceled."""
+        return self.is_canceled is not None and self.is_canceled()
+
+    def export_if_changed(
+        self,
+        source: Path,
+        target: Path,
+        url: str,
+        write: Callable[[Path, Path], None],
+        settings: dict[str, Any],
+    ) -> str:
+        if source.absolute() == target.absolute():
+            return url
+
+        if self.manifest is None:
+            write(source, target)
+            self.stats.add_copied(source.stat().st_size)
+            return url
+
+        key = target.relative_to(self.data_dir_path).as_posix()
+        fingerprint = self.manifest.fingerprint(source, **settings)
+
+        if self.manifest.is_up_to_date(key, target, fingerprint):
+            self.stats.add_skipped(fingerprint["size"])
+        else:
+            write(source, target)
+            self.stats.add_copied(fingerprint["size"])
+
+        self.manifest.record(key, target, fingerprint)
+        return url
+
+    def write_file(self, source: Path, target: Path) -> None:
+        # the previous export may have left a link pointing at the source,
+        # writing through it would truncate the source itself
+        if target.is_symlink() or target.exists():
+            target.unlink()
 
-        return "./data/" + source.name
+        if not link_file(source, target, self.options.link_mode):
+            copy_file(source, target)
 
     def is_local_file(self, url: str) -> bool:
         return url.startswith("/")
@@ -0,0 +1,6 @@
+from typing import Any
+
+
+def to_bool(value: Any) -> bool:
+    """Reads a yes/true/1 flag, e.g. from an environment variable."""
+    return str(value)[:1].lower() in ("y", "1", "t")
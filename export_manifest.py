@@ -0,0 +1,148 @@
+from pathlib import Path
+from typing import Any, Optional
+import hashlib
+import json
+import os
+import threading
+
+MANIFEST_VERSION = 1
+
+HASH_BUFFER_SIZE = 1024 * 1024
+
+Fingerprint = dict[str, Any]
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as fp:
+        while chunk := fp.read(HASH_BUFFER_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stat_fingerprint(path: Path) -> Fingerprint:
+    stat = path.stat()
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def format_size(num_bytes: int) -> str:
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class ExportStats:
+    def __init__(self) -> None:
+        self.copied_files = 0
+        self.copied_bytes = 0
+        self.skipped_files = 0
+        self.skipped_bytes = 0
+        self._lock = threading.Lock()
+
+    def add_copied(self, size: int) -> None:
+        with self._lock:
+            self.copied_files += 1
+            self.copied_bytes += size
+
+    def add_skipped(self, size: int) -> None:
+        with self._lock:
+            self.skipped_files += 1
+            self.skipped_bytes += size
+
+    def to_dict(self) -> dict[str, int]:
+        return {key: value for key, value in vars(self).items() if not key.startswith("_")}
+
+
+class ExportManifest:
+    """Remembers which source every exported data file was made from.
+
+    Entries are keyed by the target path relative to the data directory.
+    Only entries recorded during the current export are saved back, so files
+    which are no longer exported drop out of the manifest.
+    """
+
+    def __init__(self, path: str, use_hash: bool = False) -> None:
+        self.path = Path(path)
+        self.use_hash = use_hash
+        self.previous: dict[str, Fingerprint] = self._load()
+        self.current: dict[str, Fingerprint] = {}
+        self.hashes = {
+            (entry["source"], entry["size"], entry["mtime_ns"]): entry["hash"]
+            for entry in self.previous.values()
+            if entry.get("hash")
+        }
+
+    def _load(self) -> dict[str, Fingerprint]:
+        try:
+            with self.path.open() as fp:
+                data = json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+        return data.get("files", {})
+
+    def fingerprint(self, source: Path, **extra: Any) -> Fingerprint:
+        return {"source": str(source), **stat_fingerprint(source), **extra}
+
+    def is_up_to_date(self, key: str, target: Path, fingerprint: Fingerprint) -> bool:
+        """Tells whether target was already exported from an unchanged source.
+
+        Size and mtime are compared first. When hashing is enabled, a source
+        whose mtime changed but whose content did not is still up to date.
+        """
+        entry = self.previous.get(key)
+        if entry is None or not target.exists():
+            return False
+
+        if target.is_file() and entry.get("target_size") != target.stat().st_size:
+            return False
+
+        if self._same(entry, fingerprint, ("mtime_ns",)):
+            if fingerprint.get("hash") is None:
+                fingerprint["hash"] = entry.get("hash")
+            return True
+
+        if not self.use_hash or entry.get("hash") is None:
+            return False
+
+        fingerprint["hash"] = hash_file(Path(fingerprint["source"]))
+        return self._same(entry, fingerprint, ("hash",))
+
+    def cached_hash(self, source: Path) -> Optional[str]:
+        """Content hash of source from the previous export, if it did not change since."""
+        stat = stat_fingerprint(source)
+        return self.hashes.get((str(source), stat["size"], stat["mtime_ns"]))
+
+    def stale_keys(self) -> list[str]:
+        """Outputs of the previous export which were not produced by this one."""
+        return [key for key in self.previous if key not in self.current]
+
+    def _same(self, entry: Fingerprint, fingerprint: Fingerprint, extra_keys: tuple[str, ...]) -> bool:
+        keys = set(fingerprint) - {"mtime_ns", "hash"} | set(extra_keys)
+        return all(entry.get(key) == fingerprint.get(key) for key in keys)
+
+    def record(self, key: str, target: Path, fingerprint: Fingerprint) -> None:
+        if self.use_hash and fingerprint.get("hash") is None:
+            fingerprint["hash"] = hash_file(Path(fingerprint["source"]))
+        entry = dict(fingerprint)
+        if target.is_file():
+            entry["target_size"] = target.stat().st_size
+        self.current[key] = entry
+
+    def save(self) -> None:
+        data = {
+            "version": MANIFEST_VERSION,
+            "files": self.current,
+        }
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("w") as fp:
+            json.dump(data, fp, indent=4)
+        os.replace(tmp_path, self.path)
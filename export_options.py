@@ -0,0 +1,81 @@
+from dataclasses import dataclass, field, fields
+from typing import Any
+import os
+
+LINK_MODES = ("copy", "hardlink", "symlink")
+COMPRESSION_METHODS = ("gzip", "brotli")
+VECTOR_FORMATS = ("original", "flatgeobuf")
+# "" keeps the CRS of every layer
+TARGET_CRSES = ("", "EPSG:3857", "EPSG:4326")
+
+
+@dataclass
+class ExportOptions:
+    """Tunables of a single export run.
+
+    Stored under the "export" key of the project's id file, so that every
+    target project keeps its own settings between exports.
+    """
+
+    link_mode: str = "copy"
+    incremental: bool = True
+    manifest_hash: bool = False
+    max_workers: int = 1
+    compact_config: bool = False
+    vector_tiles: bool = False
+    vector_tile_min_zoom: int = 0
+    vector_tile_max_zoom: int = 14
+    cloud_optimized_geotiff: bool = False
+    cog_compression: str = "DEFLATE"
+    wms_tiles: bool = False
+    wms_tile_min_zoom: int = 0
+    wms_tile_max_zoom: int = 12
+    wms_tile_workers: int = 8
+    wms_tile_limit: int = 10000
+    minify_geojson: bool = False
+    geojson_max_zoom: int = 18
+    precompress: list[str] = field(default_factory=list)
+    content_hash_names: bool = False
+    lod_max_zooms: list[int] = field(default_factory=list)
+    geojson_shard_grid: int = 0
+    vector_format: str = "original"
+    export_features: bool = False
+    feature_limit: int = 0
+    feature_extent_filter: bool = False
+    target_crs: str = ""
+
+    def __post_init__(self) -> None:
+        if self.link_mode not in LINK_MODES:
+            raise ValueError(f"Unsupported link mode: {self.link_mode}")
+        if self.max_workers < 0:
+            raise ValueError(f"Invalid number of workers: {self.max_workers}")
+        if not 0 <= self.vector_tile_min_zoom <= self.vector_tile_max_zoom:
+            raise ValueError(
+                f"Invalid vector tile zoom range: {self.vector_tile_min_zoom}-{self.vector_tile_max_zoom}"
+            )
+        for method in self.precompress:
+            if method not in COMPRESSION_METHODS:
+                raise ValueError(f"Unsupported compression method: {method}")
+        if not 0 <= self.wms_tile_min_zoom <= self.wms_tile_max_zoom:
+            raise ValueError(f"Invalid WMS tile zoom range: {self.wms_tile_min_zoom}-{self.wms_tile_max_zoom}")
+        if any(zoom < 0 for zoom in self.lod_max_zooms) or self.lod_max_zooms != sorted(set(self.lod_max_zooms)):
+            raise ValueError(f"LOD zoom levels must be increasing: {self.lod_max_zooms}")
+        if self.vector_format not in VECTOR_FORMATS:
+            raise ValueError(f"Unsupported vector format: {self.vector_format}")
+        if self.target_crs not in TARGET_CRSES:
+            raise ValueError(f"Unsupported target CRS: {self.target_crs}")
+        if self.geojson_shard_grid < 0:
+            raise ValueError(f"Invalid shard grid size: {self.geojson_shard_grid}")
+        if self.feature_limit < 0:
+            raise ValueError(f"Invalid feature limit: {self.feature_limit}")
+        if self.wms_tile_workers < 1:
+            raise ValueError(f"Invalid number of WMS tile workers: {self.wms_tile_workers}")
+
+    @property
+    def worker_count(self) -> int:
+        return self.max_workers or os.cpu_count() or 1
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "ExportOptions":
+        known = {field.name for field in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in known})
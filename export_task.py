@@ -0,0 +1,104 @@
+from qgis.core import Qgis, QgsMessageLog, QgsProject, QgsTask
+from qgis.gui import QgsMapCanvas
+from typing import Callable, Optional
+import os
+from . import project_initializer
+from .config_exporter import JsonDict, ProjectExporter
+from .data_exporter import CancelCallback, ExportCanceled, ProgressCallback
+from .export_manifest import ExportStats
+from .export_options import ExportOptions
+
+MESSAGE_TAG = "QGIS Open Layers Map"
+
+
+def create_project_exporter(
+    qgis_instance: QgsProject, map_canvas: QgsMapCanvas, project_dir_path: str
+) -> ProjectExporter:
+    """Exporter of a QGIS project into a map project directory.
+
+    Export options are read from the map project, if it exists already.
+    """
+    options = ExportOptions()
+    if project_initializer.is_project(project_dir_path):
+        options = ExportOptions.from_dict(
+            project_initializer.read_project_id(project_dir_path).get("export", {})
+        )
+
+    return ProjectExporter(
+        qgis_instance.layerTreeRoot(),
+        qgis_instance,
+        map_canvas,
+        project_initializer.get_config_file_path(project_dir_path),
+        project_initializer.get_data_dir_path(project_dir_path),
+        options,
+        project_initializer.get_manifest_file_path(project_dir_path),
+    )
+
+
+def run_export(
+    exporter: ProjectExporter,
+    snapshot: JsonDict,
+    project_dir_path: str,
+    progress: Optional[ProgressCallback] = None,
+    is_canceled: Optional[CancelCallback] = None,
+    template: Optional[project_initializer.TemplateSource] = None,
+) -> ExportStats:
+    """Writes a snapshot into a map project, initializing an empty directory from the template."""
+    if project_initializer.is_empty(project_dir_path):
+        project_initializer.initialize_project(project_dir_path, template)
+
+    os.makedirs(exporter.data_exporter.data_dir_path, exist_ok=True)
+    os.makedirs(os.path.dirname(exporter.target_path), exist_ok=True)
+
+    stats = exporter.write(snapshot, progress=progress, is_canceled=is_canceled)
+
+    if exporter.profiler.enabled:
+        exporter.profiler.write_report(
+            project_initializer.get_report_file_path(project_dir_path), stats=stats.to_dict()
+        )
+    return stats
+
+
+class ExportTask(QgsTask):
+    """Writes a snapshot taken by ProjectExporter in the background.
+
+    Initializes the project from the template when the target directory is
+    empty, exports the layer data and writes the configuration. on_finished
+    is called on the main thread with the statistics, or None when the
+    export failed or was canceled.
+    """
+
+    def __init__(
+        self,
+        exporter: ProjectExporter,
+        snapshot: JsonDict,
+        project_dir_path: str,
+        on_finished: Callable[["ExportTask", Optional[ExportStats]], None],
+    ) -> None:
+        super().__init__("Exporting OpenLayers map", QgsTask.CanCancel)
+        self.exporter = exporter
+        self.snapshot = snapshot
+        self.project_dir_path = project_dir_path
+        self.on_finished = on_finished
+        self.stats: Optional[ExportStats] = None
+        self.error: Optional[Exception] = None
+
+    def run(self) -> bool:
+        try:
+            self.stats = run_export(
+                self.exporter,
+                self.snapshot,
+                self.project_dir_path,
+                progress=self.setProgress,
+                is_canceled=self.isCanceled,
+            )
+            return True
+        except ExportCanceled:
+            return False
+        except Exception as ex:
+            self.error = ex
+            QgsMessageLog.logMessage(f"Export failed: {ex}", MESSAGE_TAG, Qgis.Critical)
+            return False
+
+    def finished(self, result: bool) -> None:
+        self.on_finished(self, self.stats if result else None)
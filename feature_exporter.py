@@ -0,0 +1,133 @@
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsFeatureRequest,
+    QgsJsonExporter,
+    QgsRectangle,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
+)
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Optional
+import logging
+import os
+import re
+from .data_exporter import CancelCallback, DataExporter, ExportCanceled
+
+logger = logging.getLogger(__name__)
+
+# features are encoded and written this many at a time
+FEATURE_BATCH_SIZE = 1000
+
+# GeoJSON coordinates are WGS 84 (RFC 7946), unless exported in another CRS
+FEATURE_CRS = "EPSG:4326"
+
+
+def feature_request(
+    layer: QgsVectorLayer,
+    extent: Optional[tuple[float, float, float, float]],
+    limit: int,
+    attributes: Optional[list[int]],
+    crs_id: str = FEATURE_CRS,
+) -> QgsFeatureRequest:
+    """Request for the features of layer in crs_id.
+
+    extent is in EPSG:3857, limit 0 means all features and attributes None
+    all attributes.
+    """
+    crs = QgsCoordinateReferenceSystem(crs_id)
+    # the layer's project may not be QgsProject.instance(), e.g. in headless exports
+    context = layer.transformContext()
+    request = QgsFeatureRequest()
+    request.setDestinationCrs(crs, context)
+    if extent is not None:
+        # the filter of a request with a destination CRS is in that CRS
+        transform = QgsCoordinateTransform(QgsCoordinateReferenceSystem("EPSG:3857"), crs, context)
+        request.setFilterRect(transform.transformBoundingBox(QgsRectangle(*extent)))
+    if limit:
+        request.setLimit(limit)
+    if attributes is not None:
+        request.setSubsetOfAttributes(attributes)
+    return request
+
+
+def write_features(
+    feature_source: QgsVectorLayerFeatureSource,
+    request: QgsFeatureRequest,
+    precision: int,
+    attributes: Optional[list[int]],
+    crs_id: str,
+    target: Path,
+    is_canceled: Optional[CancelCallback] = None,
+) -> int:
+    """Streams the features of request into a compact GeoJSON file.
+
+    Raises ExportCanceled once is_canceled returns True, checked once per
+    batch. Returns the number of features written.
+    """
+    exporter = QgsJsonExporter()
+    exporter.setPrecision(precision)
+    # the request already transforms the geometries
+    exporter.setTransformGeometries(False)
+    if attributes is not None:
+        exporter.setAttributes(attributes)
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f"{target.stem}.tmp{target.suffix}")
+    num_features = 0
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            fp.write(f'{{"type":"FeatureCollection","crs":{{"type":"name","properties":{{"name":"{crs_id}"}}}},"features":[')
+            batch: list[str] = []
+            for feature in feature_source.getFeatures(request):
+                batch.append(exporter.exportFeature(feature))
+                if len(batch) == FEATURE_BATCH_SIZE:
+                    if is_canceled is not None and is_canceled():
+                        raise ExportCanceled()
+                    fp.write(("," if num_features else "") + ",".join(batch))
+                    num_features += len(batch)
+                    batch = []
+            if batch:
+                fp.write(("," if num_features else "") + ",".join(batch))
+                num_features += len(batch)
+            fp.write("]}")
+        os.replace(tmp_path, target)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return num_features
+
+
+def export_features(
+    data_exporter: DataExporter,
+    layer: QgsVectorLayer,
+    extent: Optional[tuple[float, float, float, float]],
+    limit: int,
+    precision: int,
+    attributes: Optional[list[int]] = None,
+    crs_id: str = FEATURE_CRS,
+) -> Future:
+    """Schedules export of the features of a layer of any provider as GeoJSON.
+
+    Features are read through a snapshot of the layer, taken here on the main
+    thread, so that the job can iterate them in the background. The subset
+    string of the layer is applied by its provider.
+    """
+    feature_source = QgsVectorLayerFeatureSource(layer)
+    layer_name = layer.name()
+    request = feature_request(layer, extent, limit, attributes, crs_id)
+    name = re.sub(r"[^\w.-]", "_", layer.id()) + ".geojson"
+    target = data_exporter.data_path("features", name)
+    url = "./data/features/" + name
+
+    def write() -> str:
+        num_features = write_features(
+            feature_source, request, precision, attributes, crs_id, target, data_exporter.canceled
+        )
+        if limit and num_features >= limit:
+            logger.warning("Exported only the first %d features of %s, raise feature_limit for more", limit, layer_name)
+        data_exporter.stats.add_copied(target.stat().st_size)
+        return url
+
+    return data_exporter.schedule(layer.id(), target, write)
@@ -0,0 +1,348 @@
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional, TextIO
+import json
+import logging
+import math
+import os
+from .data_exporter import DataExporter
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+DELIMITERS = WHITESPACE + ",:]}"
+
+# map resolution of zoom level 0, per 256px tile pixel
+DEGREES_PER_PIXEL = 360 / 256
+METERS_PER_PIXEL = 2 * math.pi * 6378137 / 256
+
+# features are reprojected this many at a time, with a single transform call
+REPROJECT_BATCH_SIZE = 1000
+
+PointsTransform = Callable[[list[tuple[float, float]]], list[tuple[float, float]]]
+FeatureTransform = Callable[[dict[str, Any]], dict[str, Any]]
+
+
+@dataclass(frozen=True)
+class Reprojection:
+    """Reprojection of GeoJSON coordinates from source_crs to crs.
+
+    create_transform is called by every job, in its own thread.
+    """
+
+    source_crs: str
+    crs: str
+    create_transform: Callable[[], PointsTransform]
+
+
+class JsonStreamReader:
+    """Decodes a JSON document incrementally from a text file.
+
+    Only the parts of the document requested by the caller are decoded,
+    everything else stays in the file, so arbitrarily large arrays can be
+    read one item at a time.
+    """
+
+    def __init__(self, fp: TextIO, chunk_size: int = CHUNK_SIZE) -> None:
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self, size: int) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fp.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character, "" at the end."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill(self.chunk_size):
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at {self.peek()!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number cut by the end of the buffer looks valid, e.g. "-0."
+                # of "-0.5", so the value has to be followed by a delimiter
+                if self.eof or (end < len(self.buffer) and self.buffer[end] in DELIMITERS):
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            # grow geometrically, so that huge values are not re-parsed too often
+            self.fill(max(self.chunk_size, len(self.buffer) - self.pos))
+
+    def items(self) -> Iterator[Any]:
+        """Yields the items of the array at the current position."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == "]":
+                self.pos += 1
+                return
+            self.expect(",")
+
+    def members(self) -> Iterator[tuple[str, "JsonStreamReader"]]:
+        """Yields keys of the object at the current position.
+
+        The caller has to consume the value of every member, with value()
+        or items(), before requesting the next one.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key, self
+            if self.peek() == "}":
+                self.pos += 1
+                return
+            self.expect(",")
+
+
+def zoom_resolution(zoom: int, geographic: bool) -> float:
+    """Size of a map pixel at zoom, in degrees or meters."""
+    return (DEGREES_PER_PIXEL if geographic else METERS_PER_PIXEL) / (1 << zoom)
+
+
+def zoom_to_decimals(max_zoom: int, geographic: bool) -> int:
+    """Decimal places keeping coordinates exact to a pixel at max_zoom."""
+    return max(0, math.ceil(-math.log10(zoom_resolution(max_zoom, geographic))))
+
+
+def round_coordinates(coordinates: Any, decimals: int) -> Any:
+    if isinstance(coordinates, list):
+        return [round_coordinates(item, decimals) for item in coordinates]
+    if isinstance(coordinates, float):
+        rounded = round(coordinates, decimals)
+        return int(rounded) if decimals == 0 else rounded
+    return coordinates
+
+
+def minify_geometry(geometry: Optional[dict[str, Any]], decimals: int) -> Optional[dict[str, Any]]:
+    if geometry is None:
+        return None
+    if geometry.get("type") == "GeometryCollection":
+        return {
+            "type": "GeometryCollection",
+            "geometries": [minify_geometry(item, decimals) for item in geometry.get("geometries", [])],
+        }
+    return {
+        "type": geometry["type"],
+        "coordinates": round_coordinates(geometry.get("coordinates"), decimals),
+    }
+
+
+def geometry_positions(geometry: Optional[dict[str, Any]]) -> Iterator[list]:
+    """Yields the positions of a geometry, as the lists they are stored in."""
+    if geometry is None:
+        return
+    if geometry.get("type") == "GeometryCollection":
+        for item in geometry.get("geometries", []):
+            yield from geometry_positions(item)
+        return
+    stack = [geometry.get("coordinates")]
+    while stack:
+        coordinates = stack.pop()
+        if isinstance(coordinates, list) and coordinates:
+            if isinstance(coordinates[0], list):
+                stack.extend(coordinates)
+            else:
+                yield coordinates
+
+
+def drop_bboxes(geometry: Optional[dict[str, Any]]) -> None:
+    if geometry is None:
+        return
+    geometry.pop("bbox", None)
+    for item in geometry.get("geometries", ()):
+        drop_bboxes(item)
+
+
+def reproject_features(features: list[dict[str, Any]], transform: PointsTransform) -> list[dict[str, Any]]:
+    """Reprojects the geometries of features in place, with one call of transform.
+
+    Returns the features, except for those with points which cannot be
+    reprojected, e.g. the poles to EPSG:3857. bbox members, which would stay
+    in the source CRS, are removed.
+    """
+    positions = []
+    owners = []
+    for index, feature in enumerate(features):
+        feature.pop("bbox", None)
+        drop_bboxes(feature.get("geometry"))
+        for position in geometry_positions(feature.get("geometry")):
+            positions.append(position)
+            owners.append(index)
+    if not positions:
+        return features
+
+    failed = set()
+    points = transform([(position[0], position[1]) for position in positions])
+    for position, owner, (x, y) in zip(positions, owners, points):
+        if math.isfinite(x) and math.isfinite(y):
+            position[0] = x
+            position[1] = y
+        else:
+            failed.add(owner)
+    return [feature for index, feature in enumerate(features) if index not in failed]
+
+
+def crs_member(crs: str) -> dict[str, Any]:
+    return {"type": "name", "properties": {"name": crs}}
+
+
+def minify_feature(feature: dict[str, Any], decimals: int, keep_properties: Iterable[str]) -> dict[str, Any]:
+    properties = feature.get("properties") or {}
+    result = {
+        "type": "Feature",
+        "geometry": minify_geometry(feature.get("geometry"), decimals),
+        "properties": {key: properties[key] for key in keep_properties if key in properties},
+    }
+    if "id" in feature:
+        result["id"] = feature["id"]
+    return result
+
+
+def dumps_compact(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def transform_feature_collection(
+    source_fp: TextIO,
+    target_fp: TextIO,
+    transform: Optional[FeatureTransform] = None,
+    reprojection: Optional[Reprojection] = None,
+) -> int:
+    """Streams a compact copy of a FeatureCollection, one feature at a time.
+
+    Every feature is passed through transform, if given. Top level members
+    other than "features" (e.g. "crs") are kept, except for "crs" of a
+    reprojected copy, which is replaced, and "bbox", which is left out.
+    Features are reprojected in batches of REPROJECT_BATCH_SIZE, those which
+    cannot be reprojected are left out.
+    Returns the number of features written.
+    """
+    points_transform = reprojection.create_transform() if reprojection is not None else None
+    count = 0
+    dropped = 0
+    separator = "{"
+    if reprojection is not None:
+        target_fp.write('{"crs":' + dumps_compact(crs_member(reprojection.crs)))
+        separator = ","
+
+    def write_features(features: list[dict[str, Any]]) -> None:
+        nonlocal count, dropped
+        if points_transform is not None:
+            reprojected = reproject_features(features, points_transform)
+            dropped += len(features) - len(reprojected)
+            features = reprojected
+        for feature in features:
+            if count:
+                target_fp.write(",")
+            target_fp.write(dumps_compact(transform(feature) if transform else feature))
+            count += 1
+
+    for key, reader in JsonStreamReader(source_fp).members():
+        if key in ("crs", "bbox") and reprojection is not None:
+            reader.value()
+            continue
+        target_fp.write(separator + dumps_compact(key) + ":")
+        separator = ","
+        if key != "features":
+            target_fp.write(dumps_compact(reader.value()))
+            continue
+
+        target_fp.write("[")
+        batch: list[dict[str, Any]] = []
+        for feature in reader.items():
+            batch.append(feature)
+            if len(batch) == REPROJECT_BATCH_SIZE:
+                write_features(batch)
+                batch = []
+        write_features(batch)
+        target_fp.write("]")
+    target_fp.write("}" if separator == "," else "{}")
+    if dropped:
+        logger.warning("Left out %d features which cannot be reprojected to %s", dropped, reprojection.crs)
+    return count
+
+
+def minify_feature_collection(
+    source_fp: TextIO,
+    target_fp: TextIO,
+    decimals: int,
+    keep_properties: Iterable[str],
+    reprojection: Optional[Reprojection] = None,
+) -> int:
+    """Streams a minified copy of a FeatureCollection, see transform_feature_collection()."""
+    transform = partial(minify_feature, decimals=decimals, keep_properties=tuple(keep_properties))
+    return transform_feature_collection(source_fp, target_fp, transform, reprojection)
+
+
+def write_minified_geojson(
+    decimals: int,
+    keep_properties: tuple[str, ...],
+    source: Path,
+    target: Path,
+    reprojection: Optional[Reprojection] = None,
+) -> None:
+    tmp_path = target.with_name(target.name + ".tmp")
+    try:
+        with source.open(encoding="utf-8") as source_fp, tmp_path.open("w", encoding="utf-8") as target_fp:
+            minify_feature_collection(source_fp, target_fp, decimals, keep_properties, reprojection)
+        if target.is_symlink() or target.exists():
+            target.unlink()
+        os.replace(tmp_path, target)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def export_minified_geojson(
+    data_exporter: DataExporter,
+    url: str,
+    decimals: int,
+    keep_properties: Iterable[str],
+    reprojection: Optional[Reprojection] = None,
+) -> Future:
+    source = Path(url)
+    keep_properties = tuple(sorted(keep_properties))
+    settings: dict[str, Any] = {"decimals": decimals, "properties": list(keep_properties)}
+    if reprojection is not None:
+        settings["crs"] = reprojection.crs
+
+    return data_exporter.export_data(
+        source,
+        data_exporter.data_path(source.name),
+        "./data/" + source.name,
+        partial(write_minified_geojson, decimals, keep_properties, reprojection=reprojection),
+        **settings,
+    )
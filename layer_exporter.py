@@ -1,38 +1,49 @@
-from qgis._core import QgsLayerTreeLayer, QgsLayerTree
-from typing import Any, Iterator, Optional
-from urllib.parse import parse_qs
+from qgis._core import QgsLayerTreeLayer, QgsLayerTree, QgsVectorLayer
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
 from .data_exporter import DataExporter
-from .style_exporter import extract_style
+from .feature_exporter import FEATURE_CRS, export_features
+from .geojson_exporter import Reprojection, export_minified_geojson, zoom_to_decimals
+from .layer_source import LayerSource, parse_layer_source
+from .raster_exporter import export_cloud_optimized_geotiff
+from .shard_exporter import INDEX_FILENAME, export_shards
+from .style_exporter import extract_style, referenced_fields
+from .tile_seeder import export_tile_pyramid
+from .vector_exporter import create_reprojection, export_flatgeobuf, export_lods, export_reprojected
+from .vector_tile_exporter import export_vector_tiles
+from .view_exporter import scale_to_zoom
 import logging
-from shlex import shlex
 
 JsonDict = dict[str, Any]
 
 
-def parse_kv_pairs(text, item_sep=",", value_sep="="):
-    """Parse key-value pairs from a shell-like text.
-    source: https://stackoverflow.com/a/38738997
-    """
-    # initialize a lexer, in POSIX mode (to properly handle escaping)
-    lexer = shlex(text, posix=True)
-    # set ',' as whitespace for the lexer
-    # (the lexer will use this character to separate words)
-    lexer.whitespace = item_sep
-    # include '=' as a word character 
-    # (this is done so that the lexer returns a list of key-value pairs)
-    # (if your option key or value contains any unquoted special character, you will need to add it here)
-    lexer.wordchars += value_sep
-    # then we separate option keys and values to build the resulting dictionary
-    # (maxsplit is required to make sure that '=' in value will not be a problem)
-    return dict(word.split(value_sep, maxsplit=1) for word in lexer)
-
-
 def safe_to_int(value: Any) -> Optional[int]:
     try:
         return int(value)
-    except ValueError:
+    except (TypeError, ValueError):
         return None
 
+
+def resolve_value(value: Any) -> Any:
+    if isinstance(value, Future):
+        return value.result()
+    if isinstance(value, list):
+        return [resolve_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: resolve_value(item) for key, item in value.items()}
+    return value
+
+
+def has_future(value: Any) -> bool:
+    if isinstance(value, Future):
+        return True
+    if isinstance(value, list):
+        return any(has_future(item) for item in value)
+    if isinstance(value, dict):
+        return any(has_future(item) for item in value.values())
+    return False
+
 logger = logging.getLogger(__name__)
 
 class LayerExporter:
@@ -40,25 +51,24 @@ class LayerExporter:
         self.root = root
         self.counter = counter
         self.data_exporter = data_exporter
+        self.num_layers = 0
+        self.layer_positions: Optional[dict[str, int]] = None
+        # EPSG:3857 extent of the view, set when WMS/WMTS tiles are seeded for
+        # it or features are filtered by it
+        self.view_extent: Optional[tuple[float, float, float, float]] = None
 
     def layer_to_dict(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
+        with self.data_exporter.profiler.layer(layerNode.layerId(), layerNode.name()):
+            return self.convert_layer(layerNode)
+
+    def convert_layer(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
         try:
-            if self.is_xyz_layer(layerNode):
-                return self.xyz_layer_to_dict(layerNode)
-            if self.is_wmts_layer(layerNode):
-                return self.wmts_layer_to_dict(layerNode)
-            if self.is_wms_layer(layerNode):
-                return self.wms_layer_to_dict(layerNode)
-            if self.is_kml_layer(layerNode):
-                return self.kml_layer_to_dict(layerNode)
-            if self.is_geojson_layer(layerNode):
-                return self.geojson_layer_to_dict(layerNode)
-            if self.is_wfs_layer(layerNode):
-                return self.wfs_layer_to_dict(layerNode)
-            if self.is_geotiff_layer(layerNode):
-                return self.geotiff_layer_to_dict(layerNode)
-            if self.is_gpx_layer(layerNode):
-                return self.gpx_layer_to_dict(layerNode)
+            source = self.layer_source(layerNode)
+            converter = self.LAYER_CONVERTERS.get(source.kind)
+            if converter is None and self.data_exporter.options.export_features and isinstance(layerNode.layer(), QgsVectorLayer):
+                converter = LayerExporter.features_layer_to_dict
+            if converter is not None:
+                return converter(self, layerNode, source)
 
             error = {
                 "error": "Unknown layer type",
@@ -75,14 +85,35 @@ class LayerExporter:
             **error,
         }
 
-    def determine_z_index(self, layerNode: QgsLayerTreeLayer) -> int:
+    def resolve_layer(self, layer_dict: JsonDict) -> JsonDict:
+        """Replaces futures of exported data with their results."""
+        try:
+            return resolve_value(layer_dict)
+        except Exception as ex:
+            logger.exception("Error exporting layer data")
+            return {
+                **{key: value for key, value in layer_dict.items() if not has_future(value)},
+                "type": "unknown",
+                "error": str(ex),
+            }
+
+    def index_layer_order(self) -> None:
+        """Reads the rendering order of layers once per export."""
         layer_order = self.root.layerOrder()
-        num_layers = len(layer_order)
+        self.num_layers = len(layer_order)
+        self.layer_positions = {layer.id(): index for index, layer in enumerate(layer_order)}
+
+    def determine_z_index(self, layerNode: QgsLayerTreeLayer) -> int:
+        if self.layer_positions is None:
+            self.index_layer_order()
+
         z_index_multiplier = 10
 
-        layer_index = layer_order.index(layerNode.layer())
+        layer_index = self.layer_positions.get(layerNode.layerId())
+        if layer_index is None:
+            raise ValueError(f"Layer {layerNode.layerId()} is not in the layer order")
 
-        return (num_layers - layer_index) * z_index_multiplier
+        return (self.num_layers - layer_index) * z_index_multiplier
 
     def layer_commons_to_dict(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
         layer = layerNode.layer()
@@ -95,181 +126,165 @@ class LayerExporter:
             "crs": layer.crs().authid(),
         }
 
-    def is_xyz_layer(self, layerNode: QgsLayerTreeLayer) -> bool:
-        layer = layerNode.layer()
-        providerType = layer.providerType().lower()
-        if providerType != "wms":
-            return False
-
-        source = layer.source()
-        layer_props = parse_qs(source)
-
-        if "type" in layer_props and layer_props["type"][0] == "xyz":
-            return True
-
-        return False
-
-    def is_wmts_layer(self, layerNode: QgsLayerTreeLayer) -> bool:
+    def layer_source(self, layerNode: QgsLayerTreeLayer) -> LayerSource:
         layer = layerNode.layer()
-        providerType = layer.providerType().lower()
-        if providerType != "wms":
-            return False
+        with self.data_exporter.profiler.phase("source"):
+            return parse_layer_source(layer.providerType(), layer.source())
 
-        source = layer.source()
-        layer_props = parse_qs(source)
+    def layer_style(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
+        with self.data_exporter.profiler.phase("style"):
+            return extract_style(layerNode)
 
-        if "tileMatrixSet" in layer_props and "url" in layer_props:
-            return True
-
-        return False
-
-    def is_wms_layer(self, layerNode: QgsLayerTreeLayer) -> bool:
-        layer = layerNode.layer()
-        providerType = layer.providerType().lower()
-        if providerType != "wms":
-            return False
-
-        source = layer.source()
-        layer_props = parse_qs(source)
-
-        if "url" in layer_props:
-            return True
-
-        return False
-
-    def is_kml_layer(self, layerNode: QgsLayerTreeLayer) -> bool:
-        layer = layerNode.layer()
-        providerType = layer.providerType().lower()
-        if providerType != "ogr":
-            return False
-
-        source = layer.source()
-        url = source.split("|")[0]
-
-        if url.lower().endswith(".kml"):
-            return True
-
-        return False
-
-    def is_geojson_layer(self, layerNode: QgsLayerTreeLayer) -> bool:
-        layer = layerNode.layer()
-        providerType = layer.providerType().lower()
-        if providerType != "ogr":
-            return False
-
-        source = layer.source()
-        url = source.split("|")[0]
-
-        if url.lower().endswith(".geojson"):
-            return True
-
-        return False
-
-    def is_wfs_layer(self, layerNode: QgsLayerTreeLayer) -> bool:
-        layer = layerNode.layer()
-        providerType = layer.providerType().lower()
-        if providerType == "wfs":
-            return True
-
-        return False
-
-    def is_geotiff_layer(self, layerNode: QgsLayerTreeLayer) -> bool:
-        layer = layerNode.layer()
-        providerType = layer.providerType().lower()
-        source = layer.source().lower()
-        file_extension = source.split(".")[-1]
-        tiff_extensions = ["tif", "tiff"]
-
-        if providerType == "gdal" and file_extension in tiff_extensions:
-            return True
-
-        return False
+    def xyz_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource) -> JsonDict:
+        return {
+            "type": "xyz",
+            **self.layer_commons_to_dict(layerNode),
+            "url": source.url,
+            "minZoom": safe_to_int(source.params.get("zmin")),
+            "maxZoom": safe_to_int(source.params.get("zmax")),
+        }
 
-    def is_gpx_layer(self, layerNode: QgsLayerTreeLayer) -> bool:
-        layer = layerNode.layer()
-        providerType = layer.providerType().lower()
-        if providerType != "ogr":
-            return False
+    def wmts_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource) -> JsonDict:
+        if self.data_exporter.options.wms_tiles and self.view_extent is not None:
+            return self.seeded_layer_to_dict(layerNode, source)
 
-        source = layer.source()
-        url = source.split("|")[0]
+        return {
+            "type": "wmts",
+            **self.layer_commons_to_dict(layerNode),
+            "url": source.url.split("?")[0],
+            "layer": source.params["layers"],
+            "format": source.params["format"],
+        }
 
-        if url.lower().endswith(".gpx"):
-            return True
+    def wms_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource) -> JsonDict:
+        if self.data_exporter.options.wms_tiles and self.view_extent is not None:
+            return self.seeded_layer_to_dict(layerNode, source)
 
-        return False
+        return {
+            "type": "wms",
+            **self.layer_commons_to_dict(layerNode),
+            "url": source.url.split("?")[0],
+            "layer": source.params["layers"],
+            "format": source.params["format"],
+        }
 
-    def xyz_layer_to_dict(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
-        layer = layerNode.layer()
-        source = layer.source()
-        layer_props = parse_qs(source)
-        url = layer_props["url"][0]
+    def seeded_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource) -> JsonDict:
+        options = self.data_exporter.options
         return {
             "type": "xyz",
             **self.layer_commons_to_dict(layerNode),
-            "url": url,
-            "minZoom": safe_to_int(layer_props.get("zmin", [None])[0]),
-            "maxZoom": safe_to_int(layer_props.get("zmax", [None])[0]),
+            "url": export_tile_pyramid(self.data_exporter, layerNode.layerId(), source, self.view_extent),
+            "minZoom": options.wms_tile_min_zoom,
+            "maxZoom": options.wms_tile_max_zoom,
         }
 
-    def wmts_layer_to_dict(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
-        layer = layerNode.layer()
-        source = layer.source()
-        layer_props = parse_qs(source)
-        url = layer_props["url"][0].split("?")[0]
+    def kml_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource) -> JsonDict:
+        if self.data_exporter.options.vector_tiles:
+            return self.vector_tile_layer_to_dict(layerNode, source)
+        if self.data_exporter.options.vector_format == "flatgeobuf" and self.data_exporter.is_local_file(source.url):
+            return self.flatgeobuf_layer_to_dict(layerNode, source)
+
+        url = self.data_exporter.process_url(source.url)
+
         return {
-            "type": "wmts",
+            "type": "kml",
             **self.layer_commons_to_dict(layerNode),
             "url": url,
-            "layer": layer_props["layers"][0],
-            "format": layer_props["format"][0],
+            **self.lods_to_dict(layerNode, source, url),
         }
 
-    def wms_layer_to_dict(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
-        layer = layerNode.layer()
-        source = layer.source()
-        layer_props = parse_qs(source)
-        url = layer_props["url"][0].split("?")[0]
+    def geojson_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource) -> JsonDict:
+        if self.data_exporter.options.vector_tiles:
+            return self.vector_tile_layer_to_dict(layerNode, source)
+        if self.data_exporter.options.vector_format == "flatgeobuf" and self.data_exporter.is_local_file(source.url):
+            return self.flatgeobuf_layer_to_dict(layerNode, source)
+
+        style = self.layer_style(layerNode)
+        if self.data_exporter.options.geojson_shard_grid and self.data_exporter.is_local_file(source.url):
+            return self.sharded_layer_to_dict(layerNode, source, style)
+
+        reprojection = self.reprojection(layerNode) if self.data_exporter.is_local_file(source.url) else None
+        if self.data_exporter.options.minify_geojson and self.data_exporter.is_local_file(source.url):
+            url = export_minified_geojson(
+                self.data_exporter, source.url, self.geojson_decimals(layerNode), referenced_fields(style), reprojection
+            )
+        elif reprojection is not None:
+            url = export_reprojected(self.data_exporter, source.url, reprojection)
+        else:
+            url = self.data_exporter.process_url(source.url)
+
         return {
-            "type": "wms",
+            "type": "geojson",
             **self.layer_commons_to_dict(layerNode),
+            **self.vector_crs_to_dict(source),
             "url": url,
-            "layer": layer_props["layers"][0],
-            "format": layer_props["format"][0],
+            "style": style,
+            **self.lods_to_dict(layerNode, source, url),
         }
 
-    def kml_layer_to_dict(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
-        layer = layerNode.layer()
-        source = layer.source()
-        props = source.split("|")
-        url = props[0]
+    def sharded_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource, style: JsonDict) -> JsonDict:
+        decimals = keep_properties = None
+        if self.data_exporter.options.minify_geojson:
+            decimals = self.geojson_decimals(layerNode)
+            keep_properties = referenced_fields(style)
+        name = Path(source.url).stem
 
         return {
-            "type": "kml",
+            "type": "shardedgeojson",
             **self.layer_commons_to_dict(layerNode),
-            "url": self.data_exporter.process_url(url),
+            **self.vector_crs_to_dict(source),
+            "url": export_shards(
+                self.data_exporter, source.url, decimals, keep_properties, self.reprojection(layerNode)
+            ),
+            "index": f"./data/shards/{name}/{INDEX_FILENAME}",
+            "style": style,
         }
 
-    def geojson_layer_to_dict(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
+    def geojson_decimals(self, layerNode: QgsLayerTreeLayer, geographic: Optional[bool] = None) -> int:
+        """Coordinate precision sufficient for the most detailed zoom the layer is shown at.
+
+        geographic tells whether coordinates are in degrees, by default
+        whether the CRS they are exported in is geographic.
+        """
+        layer = layerNode.layer()
+        max_zoom = self.data_exporter.options.geojson_max_zoom
+        if layer.hasScaleBasedVisibility() and layer.maximumScale() > 0:
+            max_zoom = min(max_zoom, scale_to_zoom(layer.maximumScale()))
+        if geographic is None:
+            target_crs = self.data_exporter.options.target_crs
+            geographic = target_crs == "EPSG:4326" if target_crs else layer.crs().isGeographic()
+        return zoom_to_decimals(max_zoom, geographic)
+
+    def features_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource) -> JsonDict:
+        """Vector layer of a provider without a file the map can read, e.g. memory, PostGIS or GeoPackage."""
         layer = layerNode.layer()
-        source = layer.source()
-        props = source.split("|")
-        url = props[0]
+        options = self.data_exporter.options
+        style = self.layer_style(layerNode)
+        attributes = None
+        if options.minify_geojson:
+            fields = layer.fields()
+            attributes = [index for index in map(fields.lookupField, referenced_fields(style)) if index >= 0]
+        extent = self.view_extent if options.feature_extent_filter else None
+        crs_id = options.target_crs or FEATURE_CRS
 
         return {
             "type": "geojson",
             **self.layer_commons_to_dict(layerNode),
-            "url": self.data_exporter.process_url(url),
-            "style": extract_style(layerNode),
+            "crs": crs_id,
+            "url": export_features(
+                self.data_exporter,
+                layer,
+                extent,
+                options.feature_limit,
+                self.geojson_decimals(layerNode, geographic=crs_id == FEATURE_CRS),
+                attributes,
+                crs_id,
+            ),
+            "style": style,
         }
 
-    def wfs_layer_to_dict(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
-        layer = layerNode.layer()
-        source = layer.source()
-        props = parse_kv_pairs(source, item_sep=" ")
-
-        url = props["url"]
-        version = props["version"]
+    def wfs_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource) -> JsonDict:
+        version = source.params["version"]
 
         if version not in ("1.0.0", "1.1.0", "2.0.0"):
             version = "1.1.0"
@@ -277,31 +292,106 @@ class LayerExporter:
         return {
             "type": "wfs",
             **self.layer_commons_to_dict(layerNode),
-            "url": self.data_exporter.process_url(url),
-            "style": extract_style(layerNode),
-            "layer": props["typename"],
+            "url": self.data_exporter.process_url(source.params["url"]),
+            "style": self.layer_style(layerNode),
+            "layer": source.params["typename"],
             "version": version,
         }
 
-    def geotiff_layer_to_dict(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
-        layer = layerNode.layer()
-        url = layer.source()
+    def geotiff_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource) -> JsonDict:
+        if self.data_exporter.options.cloud_optimized_geotiff and self.data_exporter.is_local_file(source.url):
+            url = export_cloud_optimized_geotiff(self.data_exporter, source.url)
+        else:
+            url = self.data_exporter.process_url(source.url)
 
         return {
             "type": "geotiff",
             **self.layer_commons_to_dict(layerNode),
-            "url": self.data_exporter.process_url(url),
+            "url": url,
         }
 
-    def gpx_layer_to_dict(self, layerNode: QgsLayerTreeLayer) -> JsonDict:
-        layer = layerNode.layer()
-        source = layer.source()
-        props = source.split("|")
-        url = props[0]
+    def gpx_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource) -> JsonDict:
+        if self.data_exporter.options.vector_tiles:
+            return self.vector_tile_layer_to_dict(layerNode, source)
+        if self.data_exporter.options.vector_format == "flatgeobuf" and self.data_exporter.is_local_file(source.url):
+            return self.flatgeobuf_layer_to_dict(layerNode, source)
+
+        url = self.data_exporter.process_url(source.url)
 
         return {
             "type": "gpx",
             **self.layer_commons_to_dict(layerNode),
-            "url": self.data_exporter.process_url(url),
-            "style": extract_style(layerNode),
+            "url": url,
+            "style": self.layer_style(layerNode),
+            **self.lods_to_dict(layerNode, source, url),
         }
+
+    def lods_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource, url: Any) -> JsonDict:
+        """Simplified variants of a vector layer, one per zoom band.
+
+        The last band, beyond the most detailed variant, uses the data at
+        full resolution.
+        """
+        max_zooms = self.data_exporter.options.lod_max_zooms
+        if not max_zooms or not self.data_exporter.is_local_file(source.url):
+            return {}
+
+        # KML and GPX are always WGS 84
+        reprojection = self.reprojection(layerNode) if source.kind == "geojson" else None
+        # simplification happens before reprojection, in units of the source
+        geographic = layerNode.layer().crs().isGeographic()
+        lods = export_lods(self.data_exporter, source.url, max_zooms, geographic, reprojection)
+        lods.append({"minZoom": max_zooms[-1] + 1, "maxZoom": None, "url": url})
+
+        return {"lods": lods}
+
+    def flatgeobuf_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource) -> JsonDict:
+        return {
+            "type": "flatgeobuf",
+            **self.layer_commons_to_dict(layerNode),
+            **self.vector_crs_to_dict(source),
+            "url": export_flatgeobuf(self.data_exporter, source, self.reprojection(layerNode)),
+            "style": self.layer_style(layerNode),
+        }
+
+    def reprojection(self, layerNode: QgsLayerTreeLayer) -> Optional[Reprojection]:
+        """Reprojection of the vector data of a layer to the target_crs option, None when not needed."""
+        target_crs = self.data_exporter.options.target_crs
+        crs = layerNode.layer().crs()
+        if not target_crs or crs.authid() == target_crs:
+            return None
+        return create_reprojection(crs.authid() or crs.toWkt(), target_crs)
+
+    def vector_crs_to_dict(self, source: LayerSource) -> JsonDict:
+        """CRS of vector data exported from a local file, replacing the layer's."""
+        target_crs = self.data_exporter.options.target_crs
+        if not target_crs or not self.data_exporter.is_local_file(source.url):
+            return {}
+        return {"crs": target_crs}
+
+    def vector_tile_layer_to_dict(self, layerNode: QgsLayerTreeLayer, source: LayerSource) -> JsonDict:
+        layer_name = layerNode.layer().name()
+        options = self.data_exporter.options
+
+        return {
+            "type": "vectortile",
+            **self.layer_commons_to_dict(layerNode),
+            "url": export_vector_tiles(
+                self.data_exporter, layerNode.layerId(), source, layer_name, layerNode.layer().transformContext()
+            ),
+            "layer": layer_name,
+            "minZoom": options.vector_tile_min_zoom,
+            "maxZoom": options.vector_tile_max_zoom,
+            "style": self.layer_style(layerNode),
+        }
+
+    LAYER_CONVERTERS: dict[str, Callable[["LayerExporter", QgsLayerTreeLayer, LayerSource], JsonDict]] = {
+        "xyz": xyz_layer_to_dict,
+        "wmts": wmts_layer_to_dict,
+        "wms": wms_layer_to_dict,
+        "kml": kml_layer_to_dict,
+        "geojson": geojson_layer_to_dict,
+        "wfs": wfs_layer_to_dict,
+        "geotiff": geotiff_layer_to_dict,
+        "gpx": gpx_layer_to_dict,
+    }
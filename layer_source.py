@@ -0,0 +1,109 @@
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from shlex import shlex
+from types import MappingProxyType
+from typing import Callable, Mapping, Optional
+from urllib.parse import parse_qs
+
+
+def parse_kv_pairs(text, item_sep=",", value_sep="="):
+    """Parse key-value pairs from a shell-like text.
+    source: https://stackoverflow.com/a/38738997
+    """
+    # initialize a lexer, in POSIX mode (to properly handle escaping)
+    lexer = shlex(text, posix=True)
+    # set ',' as whitespace for the lexer
+    # (the lexer will use this character to separate words)
+    lexer.whitespace = item_sep
+    # include '=' as a word character
+    # (this is done so that the lexer returns a list of key-value pairs)
+    # (if your option key or value contains any unquoted special character, you will need to add it here)
+    lexer.wordchars += value_sep
+    # then we separate option keys and values to build the resulting dictionary
+    # (maxsplit is required to make sure that '=' in value will not be a problem)
+    return dict(word.split(value_sep, maxsplit=1) for word in lexer)
+
+
+@dataclass(frozen=True)
+class LayerSource:
+    """Parsed data source of a layer.
+
+    kind is one of the layer types the exporter knows ("xyz", "wmts", "wms",
+    "kml", "geojson", "gpx", "wfs", "geotiff") or "unknown". uri is the
+    unparsed source, as understood by the provider.
+    """
+
+    provider: str
+    kind: str
+    uri: str = ""
+    url: Optional[str] = None
+    params: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    path: Optional[str] = None
+
+
+def parse_wms_source(source: str) -> LayerSource:
+    params = MappingProxyType({key: values[0] for key, values in parse_qs(source).items()})
+    url = params.get("url")
+
+    if params.get("type") == "xyz":
+        kind = "xyz"
+    elif "tileMatrixSet" in params and url is not None:
+        kind = "wmts"
+    elif url is not None:
+        kind = "wms"
+    else:
+        kind = "unknown"
+
+    return LayerSource("wms", kind, url=url, params=params)
+
+
+OGR_EXTENSIONS = {
+    "kml": "kml",
+    "geojson": "geojson",
+    "gpx": "gpx",
+}
+
+
+def parse_ogr_source(source: str) -> LayerSource:
+    path, *options = source.split("|")
+    extension = path.lower().rsplit(".", maxsplit=1)[-1]
+    kind = OGR_EXTENSIONS.get(extension, "unknown")
+    # e.g. tracks.gpx|layername=tracks
+    params = MappingProxyType(dict(option.split("=", maxsplit=1) for option in options if "=" in option))
+
+    return LayerSource("ogr", kind, url=path, params=params, path=path)
+
+
+def parse_wfs_source(source: str) -> LayerSource:
+    params = MappingProxyType(parse_kv_pairs(source, item_sep=" "))
+
+    return LayerSource("wfs", "wfs", url=params.get("url"), params=params)
+
+
+TIFF_EXTENSIONS = ["tif", "tiff"]
+
+
+def parse_gdal_source(source: str) -> LayerSource:
+    file_extension = source.lower().split(".")[-1]
+    kind = "geotiff" if file_extension in TIFF_EXTENSIONS else "unknown"
+
+    return LayerSource("gdal", kind, url=source, path=source)
+
+
+SOURCE_PARSERS: dict[str, Callable[[str], LayerSource]] = {
+    "wms": parse_wms_source,
+    "ogr": parse_ogr_source,
+    "wfs": parse_wfs_source,
+    "gdal": parse_gdal_source,
+}
+
+
+@lru_cache(maxsize=4096)
+def parse_layer_source(provider_type: str, source: str) -> LayerSource:
+    """Parses a layer source once, identical sources share the result."""
+    provider = provider_type.lower()
+    parser = SOURCE_PARSERS.get(provider)
+    if parser is None:
+        return LayerSource(provider, "unknown", uri=source, url=source)
+
+    return replace(parser(source), uri=source)
@@ -0,0 +1,154 @@
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Iterator, Optional, TypeVar
+import json
+import os
+import threading
+import time
+from .environment import to_bool
+
+T = TypeVar("T")
+
+REPORT_VERSION = 1
+
+
+PROFILE = to_bool(os.environ.get("QGIS_OL_MAP_PROFILE", "false"))
+
+
+def path_size(path: Path) -> int:
+    """Size of a file, or of all files in a directory."""
+    if path.is_dir():
+        return sum(item.stat().st_size for item in path.rglob("*") if item.is_file())
+    return path.stat().st_size if path.is_file() else 0
+
+
+def new_entry() -> dict[str, Any]:
+    return {"seconds": 0.0, "calls": 0, "bytes": 0}
+
+
+class Profiler:
+    """Records wall time and bytes of export phases, in total and per layer.
+
+    Phases may nest, and phases of jobs running on worker threads are summed
+    up, so their total can exceed the wall time of the export. A disabled
+    profiler records nothing and costs next to nothing.
+    """
+
+    def __init__(self, enabled: bool = PROFILE) -> None:
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases: dict[str, dict[str, Any]] = {}
+        self.layers: dict[str, dict[str, Any]] = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def current_layer(self) -> Optional[str]:
+        return getattr(self.local, "layer", None)
+
+    def layer(self, layer_id: str, name: str) -> ContextManager:
+        """Attributes phases within the block to a layer."""
+        if not self.enabled:
+            return nullcontext()
+        with self.lock:
+            self.layers.setdefault(layer_id, {"name": name, **new_entry(), "phases": {}})
+        return self._layer(layer_id)
+
+    @contextmanager
+    def _layer(self, layer_id: str) -> Iterator[None]:
+        previous = self.current_layer()
+        self.local.layer = layer_id
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.local.layer = previous
+            with self.lock:
+                self._add(self.layers[layer_id], time.perf_counter() - start, 0)
+
+    def phase(self, name: str) -> ContextManager:
+        if not self.enabled:
+            return nullcontext()
+        return self._phase(name)
+
+    @contextmanager
+    def _phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(
+        self,
+        name: str,
+        seconds: float = 0.0,
+        num_bytes: int = 0,
+        layer_id: Optional[str] = None,
+        deferred: bool = False,
+    ) -> None:
+        """Adds to the totals of a phase, and of the current or given layer.
+
+        Time of deferred phases, which run outside of the layer block, is
+        added to the time of the layer as well.
+        """
+        if not self.enabled:
+            return
+        layer_id = layer_id or self.current_layer()
+        with self.lock:
+            self._add(self.phases.setdefault(name, new_entry()), seconds, num_bytes)
+            if layer_id is not None and layer_id in self.layers:
+                layer = self.layers[layer_id]
+                self._add(layer["phases"].setdefault(name, new_entry()), seconds, num_bytes)
+                layer["bytes"] += num_bytes
+                if deferred:
+                    layer["seconds"] += seconds
+
+    def add_bytes(self, name: str, num_bytes: int) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.phases.setdefault(name, new_entry())["bytes"] += num_bytes
+
+    def _add(self, entry: dict[str, Any], seconds: float, num_bytes: int) -> None:
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        entry["bytes"] += num_bytes
+
+    def bind(self, name: str, target: Path, func: Callable[[], T]) -> Callable[[], T]:
+        """Wraps a deferred job, recording it as phase name of the layer scheduling it.
+
+        The size of target after the job is recorded as its bytes.
+        """
+        if not self.enabled:
+            return func
+        layer_id = self.current_layer()
+
+        @wraps(func)
+        def job() -> T:
+            start = time.perf_counter()
+            try:
+                return func()
+            finally:
+                self.record(name, time.perf_counter() - start, path_size(target), layer_id, deferred=True)
+
+        return job
+
+    def to_dict(self) -> dict[str, Any]:
+        with self.lock:
+            layers = [{"id": layer_id, **entry} for layer_id, entry in self.layers.items()]
+            return {
+                "version": REPORT_VERSION,
+                "created": datetime.now().isoformat(),
+                "seconds": time.perf_counter() - self.started,
+                "phases": {name: dict(entry) for name, entry in self.phases.items()},
+                # slowest first
+                "layers": sorted(layers, key=lambda entry: -entry["seconds"]),
+            }
+
+    def write_report(self, path: str, **extra: Any) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump({**self.to_dict(), **extra}, fp, indent=4)
+        os.replace(tmp_path, path)
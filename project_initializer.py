@@ -1,16 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from pathlib import Path
 import json
+import logging
 import os.path
+import re
 import requests
-from typing import Any
+import shutil
+import threading
+import time
+from typing import Any, Optional
 import zipfile
-import urllib.request
+
+logger = logging.getLogger(__name__)
 
 ID_FILENAME = ".qgis-ol-map"
+MANIFEST_FILENAME = ".qgis-ol-map-manifest.json"
+REPORT_FILENAME = "export-report.json"
 
 GIT_OWNER = "qgis-ol-map"
 GIT_REPO = "qgis-ol-map-template"
 
+CACHE_INFO_FILENAME = "latest.json"
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+EXTRACT_BUFFER_SIZE = 256 * 1024
+EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
+EXTRACT_BATCH_SIZE = 64
+
 SKIP = object()
 
 TEMPLATE_FILE_MAPPING = {
@@ -23,6 +40,22 @@ def get_id_file_path(target_dir: str) -> str:
     return str(target_dir).removesuffix("/") + "/" + ID_FILENAME
 
 
+def get_manifest_file_path(target_dir: str) -> str:
+    return str(target_dir).removesuffix("/") + "/" + MANIFEST_FILENAME
+
+
+def get_report_file_path(target_dir: str) -> str:
+    return str(target_dir).removesuffix("/") + "/" + REPORT_FILENAME
+
+
+def get_config_file_path(target_dir: str) -> str:
+    return str(target_dir).removesuffix("/") + "/config/config.ts"
+
+
+def get_data_dir_path(target_dir: str) -> str:
+    return str(target_dir).removesuffix("/") + "/public/data"
+
+
 def is_project(target_dir: str) -> bool:
     try:
         return os.path.isdir(target_dir) and os.path.exists(
@@ -39,15 +72,106 @@ def is_empty(target_dir: str) -> bool:
         return False
 
 
-def initialize_project(target_dir: str):
+@dataclass
+class TemplateSource:
+    """Where new projects get the template from.
+
+    A local template_zip is used as is, without network access. Otherwise
+    the latest release is cached in cache_dir and reused for max_age
+    seconds, or longer when GitHub cannot be reached.
+    """
+
+    cache_dir: str
+    max_age: float = 24 * 60 * 60
+    template_zip: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "TemplateSource":
+        cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+        return cls(
+            cache_dir=os.environ.get(
+                "QGIS_OL_MAP_TEMPLATE_CACHE", os.path.join(cache_home, "qgis-ol-map", "templates")
+            ),
+            max_age=float(os.environ.get("QGIS_OL_MAP_TEMPLATE_MAX_AGE", 24 * 60 * 60)),
+            template_zip=os.environ.get("QGIS_OL_MAP_TEMPLATE") or None,
+        )
+
+
+def initialize_project(target_dir: str, source: Optional[TemplateSource] = None):
     assert is_empty(target_dir)
 
-    info = fetch_template_info()
-    fetch_and_extract_template(info["zipball_url"], target_dir)
+    zip_path, info = get_template(source or TemplateSource.from_env())
+    extract_template(zip_path, target_dir)
 
     save_project_id(target_dir, info)
 
 
+def get_template(source: TemplateSource) -> tuple[str, dict[str, Any]]:
+    """Path of the template zip and its release info."""
+    if source.template_zip:
+        return source.template_zip, {"tag_name": Path(source.template_zip).stem}
+
+    cache_dir = Path(source.cache_dir)
+    cached = read_cached_template_info(cache_dir)
+    if cached is not None and time.time() - cached["fetched"] < source.max_age:
+        return str(cache_dir / cached["file"]), cached
+
+    try:
+        info = fetch_template_info()
+        return cache_template(cache_dir, info), info
+    except (requests.RequestException, OSError, KeyError) as ex:
+        if cached is None:
+            raise
+        logger.warning("Cannot fetch template, using cached %s: %s", cached["tag_name"], ex)
+        return str(cache_dir / cached["file"]), cached
+
+
+def read_cached_template_info(cache_dir: Path) -> Optional[dict[str, Any]]:
+    try:
+        with (cache_dir / CACHE_INFO_FILENAME).open() as fp:
+            info = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    if not (cache_dir / info.get("file", "")).is_file():
+        return None
+    return info
+
+
+def cache_template(cache_dir: Path, info: dict[str, Any]) -> str:
+    """Downloads the release unless it is cached already, returns the zip path."""
+    file_name = re.sub(r"[^\w.-]", "_", info["tag_name"]) + ".zip"
+    zip_path = cache_dir / file_name
+    if not zip_path.is_file():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        download(info["zipball_url"], zip_path)
+
+    cached = {
+        "tag_name": info["tag_name"],
+        "zipball_url": info["zipball_url"],
+        "file": file_name,
+        "fetched": time.time(),
+    }
+    tmp_path = cache_dir / (CACHE_INFO_FILENAME + ".tmp")
+    with tmp_path.open("w") as fp:
+        json.dump(cached, fp, indent=4)
+    os.replace(tmp_path, cache_dir / CACHE_INFO_FILENAME)
+    return str(zip_path)
+
+
+def download(url: str, path: Path):
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with requests.get(url, stream=True, timeout=10) as response:
+            response.raise_for_status()
+            with tmp_path.open("wb") as fp:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    fp.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
 def save_project_id(target_dir: str, info: dict[str, Any]):
     id_data = {
         "created": datetime.now().isoformat(),
@@ -58,27 +182,73 @@ def save_project_id(target_dir: str, info: dict[str, Any]):
         json.dump(id_data, fp, indent=4)
 
 
+def read_project_id(target_dir: str) -> dict[str, Any]:
+    with open(get_id_file_path(target_dir)) as fp:
+        return json.load(fp)
+
+
 def fetch_template_info() -> dict[str, Any]:
     url = f"https://api.github.com/repos/{GIT_OWNER}/{GIT_REPO}/releases/latest"
     response = requests.get(url, timeout=10)
+    response.raise_for_status()
     return response.json()
 
 
-def fetch_and_extract_template(template_zip_url: str, target_dir: str):
-    zip_path, _ = urllib.request.urlretrieve(template_zip_url)
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        names = zip_ref.namelist()
-        for name in names:
-            if name.endswith("/"):
-                continue
-
-            _, target_file_name = name.split("/", maxsplit=1)
-            target_file_name = TEMPLATE_FILE_MAPPING.get(target_file_name, target_file_name)
-            if target_file_name is SKIP:
-                continue
-
-            target_path = target_dir.removesuffix("/") + "/" + target_file_name
-
-            os.makedirs(os.path.dirname(target_path), exist_ok=True)
-            with open(target_path, "wb") as target_ref:
-                target_ref.write(zip_ref.read(name))
+def template_members(zip_ref: zipfile.ZipFile, target_dir: str) -> list[tuple[str, str]]:
+    """Pairs of template zip member and the path it is extracted to."""
+    root = os.path.abspath(target_dir)
+    members = []
+    for name in zip_ref.namelist():
+        if name.endswith("/"):
+            continue
+
+        # members are nested in a directory named after the release
+        _, target_file_name = name.split("/", maxsplit=1)
+        target_file_name = TEMPLATE_FILE_MAPPING.get(target_file_name, target_file_name)
+        if target_file_name is SKIP:
+            continue
+
+        target_path = os.path.abspath(os.path.join(root, target_file_name))
+        if os.path.commonpath([root, target_path]) != root:
+            raise ValueError(f"Template member {name} is outside of the project")
+        members.append((name, target_path))
+    return members
+
+
+def extract_template(zip_path: str, target_dir: str, workers: int = EXTRACT_WORKERS):
+    """Extracts the template zip, with a thread pool.
+
+    Members are streamed through a bounded buffer. Every worker thread
+    opens the zip on its own, so reads do not contend for a shared file
+    position.
+    """
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        members = template_members(zip_ref, target_dir)
+
+    for directory in sorted({os.path.dirname(target_path) for _, target_path in members}):
+        os.makedirs(directory, exist_ok=True)
+
+    local = threading.local()
+    opened: list[zipfile.ZipFile] = []
+    lock = threading.Lock()
+
+    def extract(batch: list[tuple[str, str]]):
+        zip_ref = getattr(local, "zip_ref", None)
+        if zip_ref is None:
+            zip_ref = local.zip_ref = zipfile.ZipFile(zip_path, "r")
+            with lock:
+                opened.append(zip_ref)
+
+        for name, target_path in batch:
+            with zip_ref.open(name) as source_ref, open(target_path, "wb") as target_ref:
+                shutil.copyfileobj(source_ref, target_ref, EXTRACT_BUFFER_SIZE)
+
+    # templates have thousands of small files, batches keep the pool overhead low
+    batches = [members[i:i + EXTRACT_BATCH_SIZE] for i in range(0, len(members), EXTRACT_BATCH_SIZE)]
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for _ in executor.map(extract, batches):
+                pass
+    finally:
+        for zip_ref in opened:
+            zip_ref.close()
@@ -24,7 +24,7 @@
 from qgis.PyQt.QtCore import QSettings, QTranslator, QCoreApplication
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction
-from qgis.core import QgsProject
+from qgis.core import Qgis, QgsApplication, QgsProject
 
 # Initialize Qt resources from file resources.py
 from .resources import *
@@ -33,13 +33,11 @@ from .resources import *
 from .qgis_open_layers_map_dialog import QgisOpenLayersMapDialog
 import os.path
 from . import project_initializer
-from .config_exporter import ProjectExporter
+from .environment import to_bool
+from .export_manifest import ExportStats, format_size
+from .export_task import ExportTask, create_project_exporter
 import os
-from typing import Any
-
-
-def to_bool(value: Any):
-    return str(value)[:1].lower() in ("y", "1", "t")
+from typing import Optional
 
 
 DEBUG = to_bool(os.environ.get("QGIS_OL_MAP_DEBUG", "false"))
@@ -79,6 +77,9 @@ class QgisOpenLayersMap:
         # Must be set in initGui() to survive plugin reloads
         self.first_start = None
 
+        # Keeps the running export task alive, QGIS does not own Python tasks
+        self.export_task = None
+
     # noinspection PyMethodMayBeStatic
     def tr(self, message):
         """Get the translation for a string using Qt translation API.
@@ -253,25 +254,25 @@ class QgisOpenLayersMap:
             self.save_config()
 
     def save_config(self):
-        project_dir_path = self.dlg.project_dir_widget.filePath()
-
-        if project_initializer.is_empty(project_dir_path):
-            project_initializer.initialize_project(project_dir_path)
+        if self.export_task is not None:
+            self.iface.messageBar().pushMessage(
+                self.tr("Export in progress"),
+                self.tr("Please wait for the running export to finish"),
+                level=Qgis.Warning,
+            )
+            return
 
-        config_target_path = (
-            str(project_dir_path).removesuffix("/") + "/config/config.ts"
+        project_dir_path = self.dlg.project_dir_widget.filePath()
+        exporter = create_project_exporter(
+            QgsProject.instance(), self.iface.mapCanvas(), project_dir_path
         )
-        data_dir_path = str(project_dir_path).removesuffix("/") + "/public/data"
-
-        os.makedirs(data_dir_path, exist_ok=True)
-        os.makedirs(os.path.dirname(config_target_path), exist_ok=True)
 
-        qgis_instance = QgsProject.instance()
-        root = qgis_instance.layerTreeRoot()
-        map_canvas = self.iface.mapCanvas()
-
-        exporter = ProjectExporter(root, qgis_instance, map_canvas, config_target_path, data_dir_path)
-        exporter.export()
+        # only the snapshot of the layer tree is taken on the main thread,
+        # template download, data export and writing run in the task
+        self.export_task = ExportTask(
+            exporter, exporter.snapshot(), project_dir_path, self.export_finished
+        )
+        QgsApplication.taskManager().addTask(self.export_task)
 
         if DEBUG:
             from qgis.PyQt.QtCore import pyqtRemoveInputHook
@@ -283,3 +284,28 @@ class QgisOpenLayersMap:
 
             pyqtRemoveInputHook()
             pdb.set_trace()
+
+    def export_finished(self, task: ExportTask, stats: Optional[ExportStats]):
+        self.export_task = None
+
+        if stats is not None:
+            self.iface.messageBar().pushMessage(
+                self.tr("Export finished"),
+                self.tr("Copied {} files ({}), skipped {} unchanged files ({})").format(
+                    stats.copied_files,
+                    format_size(stats.copied_bytes),
+                    stats.skipped_files,
+                    format_size(stats.skipped_bytes),
+                ),
+                level=Qgis.Info,
+            )
+        elif task.error is not None:
+            self.iface.messageBar().pushMessage(
+                self.tr("Export failed"), str(task.error), level=Qgis.Critical
+            )
+        else:
+            self.iface.messageBar().pushMessage(
+                self.tr("Export canceled"),
+                self.tr("The map configuration was not written"),
+                level=Qgis.Warning,
+            )
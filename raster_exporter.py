@@ -0,0 +1,50 @@
+from concurrent.futures import Future
+from functools import partial
+from pathlib import Path
+import os
+from osgeo import gdal
+from .data_exporter import DataExporter
+
+COG_BLOCK_SIZE = 512
+
+
+def write_cloud_optimized_geotiff(compression: str, source: Path, target: Path) -> None:
+    """Converts a raster to a tiled Cloud-Optimized GeoTIFF with overviews.
+
+    Needs the COG driver of GDAL 3.1 or newer.
+    """
+    tmp_path = target.with_name(target.name + ".tmp")
+    dataset = gdal.Translate(
+        str(tmp_path),
+        str(source),
+        format="COG",
+        creationOptions=[
+            f"COMPRESS={compression}",
+            f"BLOCKSIZE={COG_BLOCK_SIZE}",
+            "OVERVIEWS=AUTO",
+            "NUM_THREADS=ALL_CPUS",
+        ],
+    )
+    if dataset is None:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise RuntimeError(f"Cannot convert {source} to COG: {gdal.GetLastErrorMsg()}")
+    # closes the dataset, flushing it to disk
+    dataset = None
+
+    if target.is_symlink() or target.exists():
+        target.unlink()
+    os.replace(tmp_path, target)
+
+
+def export_cloud_optimized_geotiff(data_exporter: DataExporter, url: str) -> Future:
+    source = Path(url)
+    compression = data_exporter.options.cog_compression
+
+    return data_exporter.export_data(
+        source,
+        data_exporter.data_path(source.name),
+        "./data/" + source.name,
+        partial(write_cloud_optimized_geotiff, compression),
+        cog_compression=compression,
+    )
@@ -0,0 +1,354 @@
+from concurrent.futures import Future
+from functools import partial
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, TextIO
+import math
+import shutil
+import struct
+from .data_exporter import DataExporter
+from .geojson_exporter import (
+    FeatureTransform,
+    JsonStreamReader,
+    Reprojection,
+    dumps_compact,
+    minify_feature,
+    transform_feature_collection,
+)
+
+Bounds = tuple[float, float, float, float]
+
+INDEX_FILENAME = "index.bin"
+INDEX_MAGIC = b"OLRT"
+INDEX_VERSION = 1
+INDEX_NODE_SIZE = 16
+INDEX_HEADER = struct.Struct("<4sHHQ4d")
+INDEX_NODE = struct.Struct("<4dQ")
+
+HILBERT_MAX = (1 << 16) - 1
+
+# features are buffered per shard, all buffers are flushed beyond this size
+SHARD_BUFFER_LIMIT = 4 * 1024 * 1024
+
+EMPTY_BOUNDS: Bounds = (math.inf, math.inf, -math.inf, -math.inf)
+
+
+def extend_bounds(bounds: Bounds, other: Bounds) -> Bounds:
+    return (
+        min(bounds[0], other[0]),
+        min(bounds[1], other[1]),
+        max(bounds[2], other[2]),
+        max(bounds[3], other[3]),
+    )
+
+
+def coordinates_bounds(coordinates: Any, bounds: Bounds = EMPTY_BOUNDS) -> Bounds:
+    if not coordinates:
+        return bounds
+    if isinstance(coordinates[0], (int, float)):
+        x, y = coordinates[0], coordinates[1]
+        return (min(bounds[0], x), min(bounds[1], y), max(bounds[2], x), max(bounds[3], y))
+    for item in coordinates:
+        bounds = coordinates_bounds(item, bounds)
+    return bounds
+
+
+def geometry_bounds(geometry: Optional[dict[str, Any]]) -> Optional[Bounds]:
+    """Bounding box of a GeoJSON geometry, None when it is empty."""
+    if geometry is None:
+        return None
+    if geometry.get("type") == "GeometryCollection":
+        bounds = EMPTY_BOUNDS
+        for item in geometry.get("geometries", []):
+            item_bounds = geometry_bounds(item)
+            if item_bounds is not None:
+                bounds = extend_bounds(bounds, item_bounds)
+    else:
+        bounds = coordinates_bounds(geometry.get("coordinates"))
+    return None if bounds == EMPTY_BOUNDS else bounds
+
+
+def hilbert(x: int, y: int) -> int:
+    """Position of 16 bit coordinates along the Hilbert curve.
+
+    Same algorithm as FlatGeobuf, based on
+    https://github.com/rawrunprotected/hilbert_curves
+    """
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C ^= (a & (c >> 2)) ^ (b & (d >> 2))
+    D ^= (b & (c >> 2)) ^ ((a ^ b) & (d >> 2))
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C ^= (a & (c >> 4)) ^ (b & (d >> 4))
+    D ^= (b & (c >> 4)) ^ ((a ^ b) & (d >> 4))
+
+    a, b, c, d = A, B, C, D
+    C ^= (a & (c >> 8)) ^ (b & (d >> 8))
+    D ^= (b & (c >> 8)) ^ ((a ^ b) & (d >> 8))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+
+    def interleave(value: int) -> int:
+        value = (value | (value << 8)) & 0x00FF00FF
+        value = (value | (value << 4)) & 0x0F0F0F0F
+        value = (value | (value << 2)) & 0x33333333
+        return (value | (value << 1)) & 0x55555555
+
+    return (interleave(i1) << 1) | interleave(i0)
+
+
+def hilbert_sort(items: list[Bounds], extent: Bounds) -> list[int]:
+    """Indexes of items ordered by the Hilbert value of their centers."""
+    width = (extent[2] - extent[0]) or 1.0
+    height = (extent[3] - extent[1]) or 1.0
+
+    def key(index: int) -> int:
+        minx, miny, maxx, maxy = items[index]
+        x = int(HILBERT_MAX * ((minx + maxx) / 2 - extent[0]) / width)
+        y = int(HILBERT_MAX * ((miny + maxy) / 2 - extent[1]) / height)
+        return hilbert(x, y)
+
+    return sorted(range(len(items)), key=key)
+
+
+def level_bounds(num_items: int, node_size: int) -> list[tuple[int, int]]:
+    """Node ranges of the tree levels, leaves first.
+
+    Nodes are stored root first, so the leaves are at the end.
+    """
+    level_sizes = [num_items]
+    n = num_items
+    while n > 1:
+        n = math.ceil(n / node_size)
+        level_sizes.append(n)
+
+    end = sum(level_sizes)
+    bounds = []
+    for size in level_sizes:
+        bounds.append((end - size, end))
+        end -= size
+    return bounds
+
+
+def packed_rtree(items: list[Bounds], node_size: int = INDEX_NODE_SIZE) -> list[tuple[Bounds, int]]:
+    """Nodes of a packed R-tree over items, already sorted along the Hilbert curve.
+
+    Leaves point at the index of their item, other nodes at their first child.
+    """
+    if not items:
+        return []
+
+    levels = level_bounds(len(items), node_size)
+    nodes: list[tuple[Bounds, int]] = [(EMPTY_BOUNDS, 0)] * levels[0][1]
+
+    leaves_start = levels[0][0]
+    for index, bounds in enumerate(items):
+        nodes[leaves_start + index] = (bounds, index)
+
+    for (start, end), (parent_start, _) in zip(levels, levels[1:]):
+        for parent, first in enumerate(range(start, end, node_size), parent_start):
+            bounds = EMPTY_BOUNDS
+            for child_bounds, _ in nodes[first:min(first + node_size, end)]:
+                bounds = extend_bounds(bounds, child_bounds)
+            nodes[parent] = (bounds, first)
+    return nodes
+
+
+def write_index(path: Path, items: list[Bounds], node_size: int = INDEX_NODE_SIZE) -> None:
+    """Writes a packed Hilbert R-tree, laid out like the FlatGeobuf index.
+
+    A little endian header (magic, version, node size, number of items,
+    extent) is followed by the nodes, root first, each being four float64
+    bounds and an uint64 offset.
+    """
+    nodes = packed_rtree(items, node_size)
+    extent = nodes[0][0] if nodes else (0.0, 0.0, 0.0, 0.0)
+    with path.open("wb") as fp:
+        fp.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, node_size, len(items), *extent))
+        for bounds, offset in nodes:
+            fp.write(INDEX_NODE.pack(*bounds, offset))
+
+
+def read_features(path: Path) -> Iterator[tuple[str, Any]]:
+    """Yields ("feature", feature) or (member name, value) of a FeatureCollection, streamed."""
+    with path.open(encoding="utf-8") as fp:
+        for key, reader in JsonStreamReader(fp).members():
+            if key == "features":
+                for feature in reader.items():
+                    yield "feature", feature
+            else:
+                yield key, reader.value()
+
+
+class ShardWriter:
+    """Distributes features over the cells of a grid, one GeoJSON file per cell."""
+
+    def __init__(self, target_dir: Path, extent: Bounds, grid_size: int) -> None:
+        self.target_dir = target_dir
+        self.extent = extent
+        self.grid_size = grid_size
+        self.buffers: dict[tuple[int, int], list[str]] = {}
+        self.buffered = 0
+        self.counts: dict[tuple[int, int], int] = {}
+        self.bounds: dict[tuple[int, int], Bounds] = {}
+
+    def cell(self, bounds: Optional[Bounds]) -> tuple[int, int]:
+        if bounds is None:
+            return (0, 0)
+        minx, miny, maxx, maxy = self.extent
+        x = ((bounds[0] + bounds[2]) / 2 - minx) / ((maxx - minx) or 1.0)
+        y = ((bounds[1] + bounds[3]) / 2 - miny) / ((maxy - miny) or 1.0)
+        last = self.grid_size - 1
+        return (min(int(x * self.grid_size), last), min(int(y * self.grid_size), last))
+
+    def path(self, cell: tuple[int, int]) -> Path:
+        return self.target_dir / f"{cell[0]}_{cell[1]}.geojson"
+
+    def add(self, feature: dict[str, Any], bounds: Optional[Bounds]) -> None:
+        cell = self.cell(bounds)
+        text = dumps_compact(feature)
+        self.buffers.setdefault(cell, []).append(text)
+        self.buffered += len(text)
+        if bounds is not None:
+            self.bounds[cell] = extend_bounds(self.bounds.get(cell, EMPTY_BOUNDS), bounds)
+        if self.buffered > SHARD_BUFFER_LIMIT:
+            self.flush()
+
+    def flush(self) -> None:
+        for cell, texts in self.buffers.items():
+            count = self.counts.get(cell, 0)
+            with self.path(cell).open("a", encoding="utf-8") as fp:
+                fp.write(("," if count else '{"type":"FeatureCollection","features":[') + ",".join(texts))
+            self.counts[cell] = count + len(texts)
+        self.buffers = {}
+        self.buffered = 0
+
+    def close(self, members: dict[str, Any]) -> list[Bounds]:
+        """Finishes the shards, renamed to their position along the Hilbert curve.
+
+        Returns the bounds of the shards, in that order.
+        """
+        self.flush()
+        # members other than features, e.g. "crs", go to the end of every shard
+        footer = "]" + "".join("," + dumps_compact(key) + ":" + dumps_compact(value) for key, value in members.items()) + "}"
+
+        cells = list(self.counts)
+        bounds = [self.bounds.get(cell, self.extent) for cell in cells]
+        order = hilbert_sort(bounds, self.extent)
+        for position, index in enumerate(order):
+            path = self.path(cells[index])
+            with path.open("a", encoding="utf-8") as fp:
+                fp.write(footer)
+            path.rename(self.target_dir / f"{position}.geojson")
+        return [bounds[index] for index in order]
+
+
+def shard_feature_collection(
+    source: Path,
+    target_dir: Path,
+    grid_size: int,
+    transform: Optional[FeatureTransform] = None,
+    reprojection: Optional[Reprojection] = None,
+) -> int:
+    """Splits a FeatureCollection into grid_size x grid_size spatial shards.
+
+    Reads source twice, first for its extent, then to distribute the
+    features, each by the center of its bounding box. Features are
+    streamed, so memory use does not depend on the size of source. Writes
+    the shards 0.geojson, 1.geojson, ... and their index, returns the
+    number of shards. With a reprojection, source is reprojected once, into
+    a temporary file both passes read.
+    """
+    if reprojection is not None:
+        reprojected = target_dir.with_name(target_dir.name + ".tmp.geojson")
+        try:
+            with source.open(encoding="utf-8") as source_fp, reprojected.open("w", encoding="utf-8") as target_fp:
+                transform_feature_collection(source_fp, target_fp, reprojection=reprojection)
+            return shard_feature_collection(reprojected, target_dir, grid_size, transform)
+        finally:
+            if reprojected.exists():
+                reprojected.unlink()
+
+    extent = EMPTY_BOUNDS
+    members: dict[str, Any] = {}
+    for key, value in read_features(source):
+        if key != "feature":
+            members[key] = value
+            continue
+        bounds = geometry_bounds(value.get("geometry"))
+        if bounds is not None:
+            extent = extend_bounds(extent, bounds)
+    if extent == EMPTY_BOUNDS:
+        extent = (0.0, 0.0, 0.0, 0.0)
+
+    writer = ShardWriter(target_dir, extent, grid_size)
+    for key, value in read_features(source):
+        if key == "feature":
+            writer.add(transform(value) if transform else value, geometry_bounds(value.get("geometry")))
+
+    shard_bounds = writer.close(members)
+    write_index(target_dir / INDEX_FILENAME, shard_bounds)
+    return len(shard_bounds)
+
+
+def write_shards(
+    grid_size: int,
+    transform: Optional[FeatureTransform],
+    source: Path,
+    target: Path,
+    reprojection: Optional[Reprojection] = None,
+) -> None:
+    if target.exists():
+        shutil.rmtree(target)
+    target.mkdir(parents=True)
+
+    shard_feature_collection(source, target, grid_size, transform, reprojection)
+
+
+def export_shards(
+    data_exporter: DataExporter,
+    url: str,
+    decimals: Optional[int] = None,
+    keep_properties: Optional[Iterable[str]] = None,
+    reprojection: Optional[Reprojection] = None,
+) -> Future:
+    """Schedules sharding of a GeoJSON file into data/shards/<name>/.
+
+    Features are minified on the way when decimals is given, and
+    reprojected when reprojection is.
+    """
+    source = Path(url)
+    grid_size = data_exporter.options.geojson_shard_grid
+    transform = None
+    settings: dict[str, Any] = {"grid_size": grid_size}
+    if decimals is not None:
+        keep_properties = tuple(sorted(keep_properties or ()))
+        transform = partial(minify_feature, decimals=decimals, keep_properties=keep_properties)
+        settings.update(decimals=decimals, properties=list(keep_properties))
+    if reprojection is not None:
+        settings["crs"] = reprojection.crs
+
+    return data_exporter.export_data(
+        source,
+        data_exporter.data_path("shards", source.stem),
+        f"./data/shards/{source.stem}/{{id}}.geojson",
+        partial(write_shards, grid_size, transform, reprojection=reprojection),
+        **settings,
+    )
@@ -1,7 +1,10 @@
-from typing import Any
+from collections import OrderedDict
+from typing import Any, Optional
 from qgis._core import QgsLayerTreeLayer
 import xml.etree.ElementTree as ET
+import hashlib
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
@@ -152,17 +155,91 @@ VALUE_CONVERTERS = {
 }
 
 
-def extract_style(layer: QgsLayerTreeLayer) -> dict[str, Any]:
-    style_manager = layer.layer().styleManager()
-    style_name = style_manager.styles()[0]
-    style = style_manager.style(style_name)
-    xml_string = style.xmlData()
+# style values which name attributes of the features
+FIELD_REFERENCES = ("label_text_field",)
+
+
+def referenced_fields(style: dict[str, Any]) -> set[str]:
+    return {style[key] for key in FIELD_REFERENCES if style.get(key)}
+
+
+Step = tuple[str, Optional[tuple[str, str]]]
+
+STEP_PATTERN = re.compile(r"^([\w-]+)(?:\[@([\w-]+)='([^']*)'\])?$")
+
+
+def compile_xpath(xpath: str) -> tuple[Step, ...]:
+    """Splits the simple XPaths used in STYLE_MAPPING into (tag, attribute) steps."""
+    steps = []
+    for part in xpath.removeprefix("./").split("/"):
+        match = STEP_PATTERN.match(part)
+        if match is None:
+            raise ValueError(f"Unsupported style XPath: {xpath}")
+        tag, attr_name, attr_value = match.groups()
+        steps.append((tag, (attr_name, attr_value) if attr_name else None))
+    return tuple(steps)
+
+
+COMPILED_STYLE_MAPPING: dict[str, tuple[Step, ...]] = {
+    target: compile_xpath(source_xpath)
+    for target, (source_xpath, _) in STYLE_MAPPING.items()
+}
+
+STYLE_CACHE_SIZE = 1024
+
+style_cache: "OrderedDict[bytes, dict[str, Any]]" = OrderedDict()
+
+
+def step_matches(step: Step, element: ET.Element) -> bool:
+    tag, attr = step
+    return element.tag == tag and (attr is None or element.get(attr[0]) == attr[1])
+
+
+def find_style_elements(root: ET.Element) -> dict[str, ET.Element]:
+    """Finds the first element of every STYLE_MAPPING path in one walk.
+
+    Only subtrees which can still match some path are descended into, and
+    elements are visited in document order, like ElementTree's find().
+    """
+    found: dict[str, ET.Element] = {}
+    initial = [(target, 0) for target in COMPILED_STYLE_MAPPING]
+    stack = [(root, initial)]
+
+    while stack:
+        element, candidates = stack.pop()
+        children = []
+        for child in element:
+            child_candidates = []
+            for target, index in candidates:
+                if target in found:
+                    continue
+                steps = COMPILED_STYLE_MAPPING[target]
+                if not step_matches(steps[index], child):
+                    continue
+                if index + 1 == len(steps):
+                    found[target] = child
+                else:
+                    child_candidates.append((target, index + 1))
+            if child_candidates:
+                children.append((child, child_candidates))
+        # reversed so that the first child is processed first
+        stack.extend(reversed(children))
+
+    return found
+
+
+def extract_style_from_xml(xml_string: str) -> dict[str, Any]:
+    key = hashlib.blake2b(xml_string.encode(), digest_size=16).digest()
+    if key in style_cache:
+        style_cache.move_to_end(key)
+        return dict(style_cache[key])
 
     root = ET.fromstring(xml_string)
+    elements = find_style_elements(root)
 
     result: dict[str, Any] = {}
     for target, (source_xpath, field) in STYLE_MAPPING.items():
-        el = root.find(source_xpath)
+        el = elements.get(target)
         if el is None:
             logger.warning("Cannot find field %s", source_xpath)
             continue
@@ -170,4 +247,17 @@ def extract_style(layer: QgsLayerTreeLayer) -> dict[str, Any]:
         converter = VALUE_CONVERTERS[target]
         result[target] = converter(el.attrib[field])
 
-    return result
+    style_cache[key] = result
+    if len(style_cache) > STYLE_CACHE_SIZE:
+        style_cache.popitem(last=False)
+
+    return dict(result)
+
+
+def extract_style(layer: QgsLayerTreeLayer) -> dict[str, Any]:
+    style_manager = layer.layer().styleManager()
+    style_name = style_manager.styles()[0]
+    style = style_manager.style(style_name)
+    xml_string = style.xmlData()
+
+    return extract_style_from_xml(xml_string)
@@ -0,0 +1,120 @@
+# coding=utf-8
+"""Precompressed sidecar test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'qgis@wiktor.latanowicz.com'
+__date__ = '2025-07-10'
+__copyright__ = 'Copyright 2025, Wiktor Lataowicz'
+
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from utilities import import_plugin_module
+
+compression = import_plugin_module('compression')
+data_exporter = import_plugin_module('data_exporter')
+export_manifest = import_plugin_module('export_manifest')
+export_options = import_plugin_module('export_options')
+
+
+class CompressionTest(unittest.TestCase):
+    """Test writing compressed sidecars of exported files."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.source_dir = self.temp_dir / 'source'
+        self.data_dir = self.temp_dir / 'data'
+        self.source_dir.mkdir()
+        self.data_dir.mkdir()
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.temp_dir)
+
+    def export(self, *paths, content_hash_names=False):
+        """Export paths, return the outputs of the export."""
+        exporter = data_exporter.DataExporter(
+            str(self.data_dir),
+            export_options.ExportOptions(content_hash_names=content_hash_names),
+            export_manifest.ExportManifest(str(self.temp_dir / 'manifest.json')))
+        for path in paths:
+            exporter.process_url(str(path))
+        exporter.run_jobs()
+        return exporter.outputs()
+
+    def test_sidecars_of_outputs(self):
+        """Sidecars are written next to the outputs, in data/."""
+        source = self.source_dir / 'roads.geojson'
+        source.write_text('{"type": "FeatureCollection", "features": []}')
+
+        for content_hash_names in (False, True):
+            outputs = self.export(source, content_hash_names=content_hash_names)
+            self.assertEqual(
+                compression.write_sidecars(outputs, ['gzip'], 2), 1)
+
+            (output,) = outputs
+            self.assertEqual(output.parent, self.data_dir)
+            with gzip.open(output.with_name(output.name + '.gz')) as fp:
+                self.assertEqual(fp.read(), source.read_bytes())
+        self.assertEqual(os.listdir(self.source_dir), ['roads.geojson'])
+
+    def test_skip_up_to_date(self):
+        """A sidecar is rewritten only once its source changes."""
+        path = self.data_dir / 'roads.geojson'
+        path.write_text('[1]')
+        sidecar = self.data_dir / 'roads.geojson.gz'
+
+        self.assertTrue(compression.write_sidecar(path, 'gzip'))
+        self.assertEqual(sidecar.stat().st_mtime_ns, path.stat().st_mtime_ns)
+        self.assertFalse(compression.write_sidecar(path, 'gzip'))
+
+        path.write_text('[2]')
+        os.utime(path, ns=(0, path.stat().st_mtime_ns + 10 ** 9))
+        self.assertTrue(compression.write_sidecar(path, 'gzip'))
+        with gzip.open(sidecar) as fp:
+            self.assertEqual(fp.read(), b'[2]')
+
+    def test_directories(self):
+        """Directories are searched recursively, for compressible files."""
+        tiles = self.data_dir / 'tiles' / '0' / '0'
+        tiles.mkdir(parents=True)
+        (tiles / '0.pbf').write_bytes(b'tile')
+        (tiles / '0.png').write_bytes(b'image')
+
+        self.assertEqual(
+            compression.write_sidecars([self.data_dir / 'tiles'], ['gzip'], 1), 1)
+        self.assertEqual(
+            sorted(os.listdir(tiles)), ['0.pbf', '0.pbf.gz', '0.png'])
+
+    def test_brotli_fallback(self):
+        """Without the brotli module only the other sidecars are written."""
+        path = self.data_dir / 'roads.geojson'
+        path.write_text('[1]')
+
+        if compression.brotli is not None:
+            self.assertEqual(
+                compression.write_sidecars([path], ['gzip', 'brotli'], 1), 2)
+            return
+        with self.assertLogs(compression.logger, 'WARNING'):
+            self.assertEqual(
+                compression.write_sidecars([path], ['gzip', 'brotli'], 1), 1)
+        self.assertEqual(
+            sorted(os.listdir(self.data_dir)),
+            ['roads.geojson', 'roads.geojson.gz'])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CompressionTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,109 @@
+# coding=utf-8
+"""Data exporter test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'qgis@wiktor.latanowicz.com'
+__date__ = '2025-07-10'
+__copyright__ = 'Copyright 2025, Wiktor Lataowicz'
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from utilities import import_plugin_module
+
+data_exporter = import_plugin_module('data_exporter')
+export_manifest = import_plugin_module('export_manifest')
+export_options = import_plugin_module('export_options')
+
+
+class DataExporterTest(unittest.TestCase):
+    """Test exporting data files named after their content."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.source_dir = self.temp_dir / 'source'
+        self.data_dir = self.temp_dir / 'data'
+        self.source_dir.mkdir()
+        self.data_dir.mkdir()
+        self.manifest_path = self.temp_dir / 'manifest.json'
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.temp_dir)
+
+    def source(self, name, content):
+        path = self.source_dir / name
+        path.write_text(content)
+        return str(path)
+
+    def export(self, *urls):
+        """Export urls with hashed names, return the exporter and the URLs."""
+        exporter = data_exporter.DataExporter(
+            str(self.data_dir),
+            export_options.ExportOptions(content_hash_names=True),
+            export_manifest.ExportManifest(str(self.manifest_path)))
+        futures = [exporter.process_url(url) for url in urls]
+        exporter.run_jobs()
+        exporter.manifest.save()
+        return exporter, [future.result() for future in futures]
+
+    def test_hashed_names(self):
+        """Files are named after their content, identical ones written once."""
+        a = self.source('a.geojson', '{"a": 1}')
+        b = self.source('b.geojson', '{"a": 1}')
+        c = self.source('c.geojson', '{"c": 2}')
+
+        exporter, urls = self.export(a, b, c, a)
+
+        digest = export_manifest.hash_file(Path(a))
+        name = digest[:data_exporter.HASHED_NAME_LENGTH] + '.geojson'
+        self.assertEqual(urls[0], './data/' + name)
+        self.assertEqual(urls[1], urls[0])
+        self.assertEqual(urls[3], urls[0])
+        self.assertNotEqual(urls[2], urls[0])
+        self.assertEqual(
+            sorted(os.listdir(self.data_dir)),
+            sorted([name, urls[2][len('./data/'):]]))
+        self.assertEqual((self.data_dir / name).read_text(), '{"a": 1}')
+
+    def test_outputs_are_in_data_dir(self):
+        """Outputs of hashed files are the written files, not their sources."""
+        a = self.source('a.geojson', '{"a": 1}')
+        b = self.source('b.geojson', '{"a": 1}')
+
+        exporter, urls = self.export(a, b)
+
+        self.assertEqual(
+            exporter.outputs(), [self.data_dir / urls[0][len('./data/'):]])
+
+    def test_remove_stale_outputs(self):
+        """Files of the previous export and their sidecars are removed."""
+        a = self.source('a.geojson', '{"a": 1}')
+        _, (old_url,) = self.export(a)
+        old_path = self.data_dir / old_url[len('./data/'):]
+        old_sidecar = old_path.with_name(old_path.name + '.gz')
+        old_sidecar.write_bytes(b'')
+
+        self.source('a.geojson', '{"a": 2}')
+        exporter, (new_url,) = self.export(a)
+        exporter.remove_stale_outputs()
+
+        self.assertNotEqual(new_url, old_url)
+        self.assertEqual(
+            os.listdir(self.data_dir), [new_url[len('./data/'):]])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataExporterTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,191 @@
+# coding=utf-8
+"""Export pipeline benchmarks against stored baselines.
+
+Every benchmark is compared with its time in the baseline file, and fails
+when it is more than QGIS_OL_MAP_BENCHMARK_THRESHOLD (default 1.5) times
+slower. Benchmarks without a baseline are skipped. Set
+QGIS_OL_MAP_BENCHMARK_UPDATE=1 to record the baselines instead of comparing
+with them. Baselines depend on the machine, record them on the one running
+the benchmarks.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'qgis@wiktor.latanowicz.com'
+__date__ = '2025-07-10'
+__copyright__ = 'Copyright 2025, Wiktor Lataowicz'
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from qgis.core import QgsProject, QgsRectangle
+
+from utilities import (
+    get_qgis_app, import_plugin_module, create_synthetic_project,
+    write_geojson)
+QGIS_APP = get_qgis_app()
+
+config_exporter = import_plugin_module('config_exporter')
+environment = import_plugin_module('environment')
+data_exporter = import_plugin_module('data_exporter')
+style_exporter = import_plugin_module('style_exporter')
+view_exporter = import_plugin_module('view_exporter')
+
+BASELINE_PATH = os.environ.get(
+    'QGIS_OL_MAP_BENCHMARK_BASELINE',
+    os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json'))
+THRESHOLD = float(os.environ.get('QGIS_OL_MAP_BENCHMARK_THRESHOLD', '1.5'))
+UPDATE = environment.to_bool(
+    os.environ.get('QGIS_OL_MAP_BENCHMARK_UPDATE', 'false'))
+REPEATS = 3
+
+NUM_LAYERS = 200
+DEPTH = 20
+NUM_FEATURES = 20000
+RASTER_SIZE = 2048
+NUM_CATEGORIES = 200
+
+
+def best_time(func, setup=None):
+    """Return the shortest of REPEATS timed runs of func.
+
+    setup is called before every run, outside of the timing.
+    """
+    times = []
+    for _ in range(REPEATS):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+class ExportBenchmarkTest(unittest.TestCase):
+    """Time the export pipeline on a synthetic project."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.source_dir = os.path.join(cls.temp_dir, 'source')
+        os.mkdir(cls.source_dir)
+        cls.project = QgsProject()
+        cls.layers = create_synthetic_project(
+            cls.project, cls.source_dir, NUM_LAYERS, DEPTH, NUM_FEATURES,
+            RASTER_SIZE, NUM_CATEGORIES)
+        cls.viewport = view_exporter.StaticViewport(
+            QgsRectangle(-20, -20, 20, 20), 50000000)
+
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as fp:
+                cls.baseline = json.load(fp)
+        elif UPDATE:
+            cls.baseline = {}
+        else:
+            raise unittest.SkipTest(
+                'No benchmark baseline in %s, record one with '
+                'QGIS_OL_MAP_BENCHMARK_UPDATE=1' % BASELINE_PATH)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.project.clear()
+        shutil.rmtree(cls.temp_dir)
+        if UPDATE:
+            with open(BASELINE_PATH, 'w') as fp:
+                json.dump(cls.baseline, fp, indent=4, sort_keys=True)
+
+    def assertNotRegressed(self, name, seconds):
+        """Compare seconds with the baseline of benchmark name."""
+        if UPDATE:
+            type(self).baseline[name] = seconds
+            return
+        baseline = self.baseline.get(name)
+        if baseline is None:
+            self.skipTest('No baseline of %s' % name)
+        self.assertLess(
+            seconds, baseline * THRESHOLD,
+            '%s regressed: %.4fs, baseline %.4fs' % (name, seconds, baseline))
+
+    def create_exporter(self, name):
+        target_dir = os.path.join(self.temp_dir, name)
+        shutil.rmtree(target_dir, ignore_errors=True)
+        os.makedirs(os.path.join(target_dir, 'data'))
+        return config_exporter.ProjectExporter(
+            self.project.layerTreeRoot(),
+            self.project,
+            self.viewport,
+            os.path.join(target_dir, 'config.ts'),
+            os.path.join(target_dir, 'data'))
+
+    def test_to_dict(self):
+        """Layer tree, styles and data of the whole project."""
+        result = {}
+
+        def run():
+            result['config'] = self.create_exporter('to_dict').to_dict()
+
+        self.assertNotRegressed('to_dict', best_time(run))
+        self.assertIn('group 0', result['config']['layers'])
+
+    def test_export(self):
+        """Full export, including writing data files and configuration."""
+        exporters = []
+
+        def setup():
+            exporters.append(self.create_exporter('export'))
+
+        def run():
+            exporters[-1].export()
+
+        self.assertNotRegressed('export', best_time(run, setup))
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.temp_dir, 'export', 'data'))),
+            NUM_LAYERS)
+
+    def test_extract_style(self):
+        """Style extraction of every vector layer, cold and cached."""
+        nodes = [
+            node for node in self.project.layerTreeRoot().findLayers()
+            if node.layer().type() == node.layer().VectorLayer]
+
+        def run():
+            for node in nodes:
+                style_exporter.extract_style(node)
+
+        self.assertNotRegressed(
+            'extract_style', best_time(run, style_exporter.style_cache.clear))
+        self.assertNotRegressed('extract_style_cached', best_time(run))
+
+    def test_process_url(self):
+        """Copying a large GeoJSON file into the data directory."""
+        source = write_geojson(
+            os.path.join(self.temp_dir, 'large.geojson'), NUM_FEATURES * 10)
+        exporters = []
+
+        def setup():
+            target_dir = os.path.join(self.temp_dir, 'process_url')
+            shutil.rmtree(target_dir, ignore_errors=True)
+            os.makedirs(target_dir)
+            exporters.append(data_exporter.DataExporter(target_dir))
+
+        def run():
+            exporter = exporters[-1]
+            url = exporter.process_url(source)
+            exporter.run_jobs()
+            url.result()
+
+        self.assertNotRegressed('process_url', best_time(run, setup))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ExportBenchmarkTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
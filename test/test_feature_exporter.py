@@ -0,0 +1,117 @@
+# coding=utf-8
+"""Feature streaming test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'qgis@wiktor.latanowicz.com'
+__date__ = '2025-07-10'
+__copyright__ = 'Copyright 2025, Wiktor Lataowicz'
+
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from qgis.core import (
+    QgsFeature, QgsGeometry, QgsPointXY, QgsVectorLayer)
+
+from utilities import get_qgis_app, import_plugin_module
+QGIS_APP = get_qgis_app()
+
+data_exporter = import_plugin_module('data_exporter')
+feature_exporter = import_plugin_module('feature_exporter')
+
+NUM_FEATURES = 2500
+
+
+def create_memory_layer():
+    """Return a memory layer of points at x = 0..NUM_FEATURES-1 metres."""
+    layer = QgsVectorLayer(
+        'Point?crs=EPSG:3857&field=name:string&field=value:integer',
+        'points', 'memory')
+    features = []
+    for i in range(NUM_FEATURES):
+        feature = QgsFeature(layer.fields())
+        feature.setAttributes(['point %d' % i, i])
+        feature.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(i, 0)))
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+class FeatureExporterTest(unittest.TestCase):
+    """Test exporting features of a provider as GeoJSON."""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.layer = create_memory_layer()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def export(self, extent=None, limit=0, attributes=None):
+        exporter = data_exporter.DataExporter(str(self.temp_dir))
+        url = feature_exporter.export_features(
+            exporter, self.layer, extent, limit, 7, attributes)
+        exporter.run_jobs()
+        with open(self.temp_dir / url.result()[len('./data/'):]) as fp:
+            return json.load(fp)
+
+    def test_all_features(self):
+        """Every feature is written, in batches, in EPSG:4326."""
+        collection = self.export()
+
+        features = collection['features']
+        self.assertEqual(len(features), NUM_FEATURES)
+        self.assertGreater(NUM_FEATURES, feature_exporter.FEATURE_BATCH_SIZE)
+        self.assertEqual(features[0]['properties'], {'name': 'point 0', 'value': 0})
+        x, y = features[-1]['geometry']['coordinates']
+        self.assertAlmostEqual(x, 0.0224489, places=6)
+        self.assertAlmostEqual(y, 0)
+
+    def test_limit_and_attributes(self):
+        """Limits and attribute subsets apply to the request."""
+        collection = self.export(limit=10, attributes=[1])
+
+        self.assertEqual(len(collection['features']), 10)
+        self.assertEqual(collection['features'][3]['properties'], {'value': 3})
+
+    def test_subset_and_extent(self):
+        """The layer's subset string and the extent filter features."""
+        self.layer.setSubsetString('"value" % 2 = 0')
+        collection = self.export(extent=(-0.5, -1, 99.5, 1))
+
+        values = [
+            feature['properties']['value']
+            for feature in collection['features']]
+        self.assertEqual(sorted(values), list(range(0, 100, 2)))
+
+    def test_cancel(self):
+        """Writing stops at the next batch once the export is canceled."""
+        exporter = data_exporter.DataExporter(str(self.temp_dir))
+        url = feature_exporter.export_features(
+            exporter, self.layer, None, 0, 7)
+        checks = []
+
+        def is_canceled():
+            # the first check happens before the job starts
+            checks.append(True)
+            return len(checks) > 1
+
+        with self.assertRaises(data_exporter.ExportCanceled):
+            exporter.run_jobs(is_canceled=is_canceled)
+
+        self.assertIsInstance(url.exception(), data_exporter.ExportCanceled)
+        self.assertEqual(list(self.temp_dir.rglob('*.geojson')), [])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(FeatureExporterTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,168 @@
+# coding=utf-8
+"""GeoJSON minification test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'qgis@wiktor.latanowicz.com'
+__date__ = '2025-07-10'
+__copyright__ = 'Copyright 2025, Wiktor Lataowicz'
+
+import io
+import json
+import unittest
+
+from utilities import import_plugin_module
+
+geojson_exporter = import_plugin_module('geojson_exporter')
+
+COLLECTION = {
+    'type': 'FeatureCollection',
+    'crs': {'type': 'name', 'properties': {'name': 'EPSG:4326'}},
+    'features': [
+        {
+            'type': 'Feature',
+            'id': 7,
+            'properties': {'name': 'Warsaw', 'population': 1863056},
+            'geometry': {
+                'type': 'LineString',
+                'coordinates': [[21.0122287, 52.2296756], [21.1, 52.3]],
+            },
+        },
+        {'type': 'Feature', 'properties': None, 'geometry': None},
+    ],
+}
+
+
+def minify(text, decimals=3, keep_properties=('name',)):
+    output = io.StringIO()
+    count = geojson_exporter.minify_feature_collection(
+        io.StringIO(text), output, decimals, keep_properties)
+    return count, output.getvalue()
+
+
+class GeoJsonExporterTest(unittest.TestCase):
+    """Test streaming GeoJSON minification."""
+
+    def test_minify(self):
+        """Coordinates are rounded, unused properties and whitespace dropped."""
+        count, output = minify(json.dumps(COLLECTION, indent=4))
+
+        self.assertEqual(count, 2)
+        self.assertNotIn(' ', output)
+        result = json.loads(output)
+        self.assertEqual(result['crs'], COLLECTION['crs'])
+        self.assertEqual(result['features'][0], {
+            'type': 'Feature',
+            'id': 7,
+            'properties': {'name': 'Warsaw'},
+            'geometry': {
+                'type': 'LineString',
+                'coordinates': [[21.012, 52.23], [21.1, 52.3]],
+            },
+        })
+        self.assertIsNone(result['features'][1]['geometry'])
+
+    def test_small_chunks(self):
+        """Values split across read chunks are decoded correctly."""
+        text = json.dumps({'a': [1, 22, 333, {'b': 'x"]'}], 'c': -0.5})
+        for chunk_size in (1, 2, 3, 7):
+            reader = geojson_exporter.JsonStreamReader(
+                io.StringIO(text), chunk_size)
+            result = {}
+            for key, member in reader.members():
+                result[key] = (
+                    list(member.items()) if key == 'a' else member.value())
+            self.assertEqual(result, json.loads(text))
+
+    def test_reproject(self):
+        """Coordinates are transformed in batches and the crs replaced."""
+        calls = []
+
+        def create_transform():
+            def transform(points):
+                calls.append(len(points))
+                return [(x * 2, y * 2) for x, y in points]
+            return transform
+
+        reprojection = geojson_exporter.Reprojection(
+            'EPSG:4326', 'EPSG:3857', create_transform)
+        num_features = geojson_exporter.REPROJECT_BATCH_SIZE + 1
+        collection = dict(COLLECTION, features=[
+            {
+                'type': 'Feature',
+                'properties': {},
+                'geometry': {'type': 'Point', 'coordinates': [i, 0.5, 7]},
+            }
+            for i in range(num_features)])
+        output = io.StringIO()
+        count = geojson_exporter.minify_feature_collection(
+            io.StringIO(json.dumps(collection)), output, 1, (), reprojection)
+
+        self.assertEqual(count, num_features)
+        self.assertEqual(calls, [num_features - 1, 1])
+        result = json.loads(output.getvalue())
+        self.assertEqual(result['crs'], {
+            'type': 'name', 'properties': {'name': 'EPSG:3857'}})
+        self.assertEqual(
+            result['features'][-1]['geometry']['coordinates'],
+            [2 * (num_features - 1), 1, 7])
+
+    def test_reproject_drops_failed_features(self):
+        """Features with points that fail to transform and bboxes are left out."""
+        def create_transform():
+            return lambda points: [
+                (x, float('inf') if abs(y) == 90 else y) for x, y in points]
+
+        reprojection = geojson_exporter.Reprojection(
+            'EPSG:4326', 'EPSG:3857', create_transform)
+        collection = {
+            'type': 'FeatureCollection',
+            'bbox': [0, 0, 1, 90],
+            'features': [
+                {
+                    'type': 'Feature',
+                    'bbox': [0, 0, 1, 1],
+                    'properties': {'name': 'kept'},
+                    'geometry': {
+                        'type': 'LineString',
+                        'bbox': [0, 0, 1, 1],
+                        'coordinates': [[0, 0], [1, 1]],
+                    },
+                },
+                {
+                    'type': 'Feature',
+                    'properties': {'name': 'pole'},
+                    'geometry': {'type': 'Point', 'coordinates': [0, 90]},
+                },
+            ],
+        }
+        output = io.StringIO()
+        count = geojson_exporter.transform_feature_collection(
+            io.StringIO(json.dumps(collection)), output,
+            reprojection=reprojection)
+
+        self.assertEqual(count, 1)
+        result = json.loads(output.getvalue())
+        self.assertNotIn('bbox', result)
+        self.assertEqual(result['features'], [{
+            'type': 'Feature',
+            'properties': {'name': 'kept'},
+            'geometry': {'type': 'LineString', 'coordinates': [[0, 0], [1, 1]]},
+        }])
+
+    def test_zoom_to_decimals(self):
+        """Precision follows the pixel size at the maximum zoom."""
+        self.assertEqual(geojson_exporter.zoom_to_decimals(18, True), 6)
+        self.assertEqual(geojson_exporter.zoom_to_decimals(18, False), 1)
+        self.assertEqual(geojson_exporter.zoom_to_decimals(0, False), 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(GeoJsonExporterTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
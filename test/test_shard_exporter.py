@@ -0,0 +1,155 @@
+# coding=utf-8
+"""Spatial sharding and packed R-tree test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'qgis@wiktor.latanowicz.com'
+__date__ = '2025-07-10'
+__copyright__ = 'Copyright 2025, Wiktor Lataowicz'
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from utilities import import_plugin_module
+
+geojson_exporter = import_plugin_module('geojson_exporter')
+shard_exporter = import_plugin_module('shard_exporter')
+
+
+def point(x, y, name):
+    return {
+        'type': 'Feature',
+        'properties': {'name': name},
+        'geometry': {'type': 'Point', 'coordinates': [x, y]},
+    }
+
+
+def read_index(path):
+    """Return the header and nodes of an index file."""
+    data = path.read_bytes()
+    header = shard_exporter.INDEX_HEADER.unpack_from(data)
+    nodes = [
+        shard_exporter.INDEX_NODE.unpack_from(data, offset)
+        for offset in range(
+            shard_exporter.INDEX_HEADER.size, len(data),
+            shard_exporter.INDEX_NODE.size)]
+    return header, nodes
+
+
+class ShardExporterTest(unittest.TestCase):
+    """Test splitting GeoJSON into spatial shards."""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_hilbert_curve_is_continuous(self):
+        """Consecutive cells along the curve are neighbours."""
+        size = 16
+        shift = 16 - 4
+        cells = sorted(
+            ((x, y) for x in range(size) for y in range(size)),
+            key=lambda cell: shard_exporter.hilbert(
+                cell[0] << shift, cell[1] << shift))
+        for (x1, y1), (x2, y2) in zip(cells, cells[1:]):
+            self.assertEqual(abs(x1 - x2) + abs(y1 - y2), 1)
+
+    def test_packed_rtree(self):
+        """Parents cover their children, leaves point at items."""
+        items = [(i, i, i + 1, i + 1) for i in range(40)]
+        nodes = shard_exporter.packed_rtree(items, node_size=4)
+        levels = shard_exporter.level_bounds(len(items), 4)
+
+        self.assertEqual(levels, [(14, 54), (4, 14), (1, 4), (0, 1)])
+        self.assertEqual(len(nodes), 54)
+        self.assertEqual(nodes[0], ((0, 0, 40, 40), 1))
+        self.assertEqual(nodes[14], (items[0], 0))
+        self.assertEqual(nodes[53], (items[39], 39))
+        self.assertEqual(nodes[4], ((0, 0, 4, 4), 14))
+        self.assertEqual(nodes[3], ((32, 32, 40, 40), 12))
+
+    def test_shards(self):
+        """Every feature ends up in exactly one shard, the index covers them."""
+        features = [
+            point(x * 10 + 5, y * 10 + 5, '%d,%d' % (x, y))
+            for x in range(8) for y in range(8)]
+        features.append({'type': 'Feature', 'properties': {}, 'geometry': None})
+        source = self.temp_dir / 'points.geojson'
+        source.write_text(json.dumps({
+            'type': 'FeatureCollection',
+            'features': features,
+            'crs': {'type': 'name', 'properties': {'name': 'EPSG:4326'}},
+        }))
+        target = self.temp_dir / 'shards'
+        shard_exporter.write_shards(4, None, source, target)
+
+        header, nodes = read_index(target / shard_exporter.INDEX_FILENAME)
+        magic, version, node_size, num_items = header[:4]
+        self.assertEqual((magic, version, num_items), (b'OLRT', 1, 16))
+        self.assertEqual(header[4:], (5, 5, 75, 75))
+
+        names = []
+        leaves = nodes[-num_items:]
+        for position in range(num_items):
+            with open(target / ('%d.geojson' % position)) as fp:
+                shard = json.load(fp)
+            self.assertEqual(shard['crs'], {
+                'type': 'name', 'properties': {'name': 'EPSG:4326'}})
+            minx, miny, maxx, maxy, offset = leaves[position]
+            self.assertEqual(offset, position)
+            for feature in shard['features']:
+                names.append(feature['properties'].get('name'))
+                if feature['geometry'] is not None:
+                    x, y = feature['geometry']['coordinates']
+                    self.assertTrue(minx <= x <= maxx and miny <= y <= maxy)
+
+        self.assertEqual(len(names), len(features))
+        self.assertEqual(
+            sorted(os.listdir(target)),
+            sorted(['%d.geojson' % i for i in range(16)] + ['index.bin']))
+
+    def test_reprojected_shards(self):
+        """Shards and their index are in the target CRS."""
+        source = self.temp_dir / 'points.geojson'
+        source.write_text(json.dumps({
+            'type': 'FeatureCollection',
+            'features': [point(x, x, str(x)) for x in range(4)],
+        }))
+        calls = []
+
+        def transform(points):
+            calls.append(len(points))
+            return [(x + 100, -y) for x, y in points]
+
+        reprojection = geojson_exporter.Reprojection(
+            'EPSG:4326', 'EPSG:3857', lambda: transform)
+        target = self.temp_dir / 'shards'
+        shard_exporter.write_shards(2, None, source, target, reprojection)
+
+        # reprojected once, in a single batch
+        self.assertEqual(calls, [4])
+        self.assertEqual(
+            sorted(os.listdir(self.temp_dir)), ['points.geojson', 'shards'])
+
+        header, _ = read_index(target / shard_exporter.INDEX_FILENAME)
+        self.assertEqual(header[4:], (100, -3, 103, 0))
+        with open(target / '0.geojson') as fp:
+            shard = json.load(fp)
+        self.assertEqual(shard['crs']['properties']['name'], 'EPSG:3857')
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ShardExporterTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
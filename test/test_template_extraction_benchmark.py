@@ -0,0 +1,101 @@
+# coding=utf-8
+"""Template extraction benchmark.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'qgis@wiktor.latanowicz.com'
+__date__ = '2025-07-10'
+__copyright__ = 'Copyright 2025, Wiktor Lataowicz'
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import zipfile
+
+from utilities import BENCHMARK, import_plugin_module
+
+project_initializer = import_plugin_module('project_initializer')
+
+NUM_PACKAGES = 300
+FILES_PER_PACKAGE = 10
+
+
+def create_template_zip(path):
+    """Write a template zip with vendored node_modules, like a release zipball."""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.writestr('template-abc123/', '')
+        zip_ref.writestr('template-abc123/README.md', 'template readme')
+        zip_ref.writestr('template-abc123/README.template.md', 'project readme')
+        zip_ref.writestr('template-abc123/package.json', '{}')
+        for package in range(NUM_PACKAGES):
+            for number in range(FILES_PER_PACKAGE):
+                zip_ref.writestr(
+                    'template-abc123/node_modules/package-%d/lib/file-%d.js' % (package, number),
+                    ('module.exports = %d;\n' % number) * 200)
+
+
+def time_extraction(zip_path, workers):
+    """Return the time needed to extract the template into a new directory."""
+    target_dir = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        project_initializer.extract_template(zip_path, target_dir, workers)
+        elapsed = time.perf_counter() - start
+        num_files = sum(len(files) for _, _, files in os.walk(target_dir))
+        with open(os.path.join(target_dir, 'README.md')) as fp:
+            readme = fp.read()
+        with open(os.path.join(target_dir, 'node_modules/package-7/lib/file-3.js')) as fp:
+            module = fp.read()
+    finally:
+        shutil.rmtree(target_dir)
+    return elapsed, num_files, readme, module
+
+
+class TemplateExtractionBenchmarkTest(unittest.TestCase):
+    """Test extraction of a template with thousands of files."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp()
+        cls.zip_path = os.path.join(cls.temp_dir, 'template.zip')
+        create_template_zip(cls.zip_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir)
+
+    def test_extracts_all_files(self):
+        """Every member is extracted, README.template.md replaces README.md."""
+        _, num_files, readme, module = time_extraction(self.zip_path, 4)
+        self.assertEqual(num_files, NUM_PACKAGES * FILES_PER_PACKAGE + 2)
+        self.assertEqual(readme, 'project readme')
+        self.assertEqual(module, 'module.exports = 3;\n' * 200)
+
+    def test_rejects_members_outside_of_project(self):
+        """Members must not escape the project directory."""
+        zip_path = os.path.join(self.temp_dir, 'evil.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zip_ref:
+            zip_ref.writestr('template-abc123/../../evil.js', '')
+        with self.assertRaises(ValueError):
+            project_initializer.extract_template(zip_path, self.temp_dir)
+
+    @unittest.skipUnless(BENCHMARK, 'set QGIS_OL_MAP_BENCHMARK=1 to run')
+    def test_parallel_extraction(self):
+        """Extracting on a thread pool is not slower than on one thread."""
+        sequential, _, _, _ = time_extraction(self.zip_path, 1)
+        parallel, _, _, _ = time_extraction(self.zip_path, 8)
+        # the gain depends on the disk, allow generous noise
+        self.assertLess(parallel, sequential * 2)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TemplateExtractionBenchmarkTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
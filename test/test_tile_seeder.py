@@ -0,0 +1,172 @@
+# coding=utf-8
+"""Tile seeder test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'qgis@wiktor.latanowicz.com'
+__date__ = '2025-07-10'
+__copyright__ = 'Copyright 2025, Wiktor Lataowicz'
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from utilities import import_plugin_module
+
+tile_seeder = import_plugin_module('tile_seeder')
+data_exporter = import_plugin_module('data_exporter')
+export_options = import_plugin_module('export_options')
+layer_source = import_plugin_module('layer_source')
+
+PNG = b'\x89PNG\r\n\x1a\n'
+
+
+class StubWmsHandler(BaseHTTPRequestHandler):
+    """Answers GetMap requests with a fake PNG, records the requests."""
+
+    protocol_version = 'HTTP/1.1'
+    requests = []
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        self.requests.append(query)
+        if query['LAYERS'] == ['broken']:
+            body = b'<ServiceExceptionReport/>'
+            content_type = 'text/xml'
+        else:
+            body = PNG + query['BBOX'][0].encode()
+            content_type = 'image/png'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TileSeederTest(unittest.TestCase):
+    """Test seeding XYZ tiles from a WMS."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubWmsHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.start()
+        cls.url = 'http://127.0.0.1:%d/wms' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.thread.join()
+
+    def setUp(self):
+        """Runs before each test."""
+        StubWmsHandler.requests = []
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.data_dir)
+
+    def source(self, layers):
+        return layer_source.parse_layer_source(
+            'wms', 'format=image/png&layers=%s&url=%s' % (layers, self.url))
+
+    def test_tile_range_of_world(self):
+        """The whole world is one tile at zoom 0 and 4x4 at zoom 2."""
+        world = (-tile_seeder.ORIGIN_SHIFT, -tile_seeder.ORIGIN_SHIFT,
+                 tile_seeder.ORIGIN_SHIFT, tile_seeder.ORIGIN_SHIFT)
+        self.assertEqual(tile_seeder.count_tiles(world, 0, 0), 1)
+        self.assertEqual(tile_seeder.count_tiles(world, 2, 2), 16)
+        self.assertEqual(tile_seeder.tile_extent(0, 0, 0), world)
+
+    def test_seed_pyramid(self):
+        """Every tile of the pyramid is fetched and written to z/x/y."""
+        exporter = data_exporter.DataExporter(
+            self.data_dir, export_options.ExportOptions(wms_tile_max_zoom=3))
+        extent = (0, 0, 1000, 1000)
+
+        future = tile_seeder.export_tile_pyramid(
+            exporter, 'layer 1', self.source('roads'), extent)
+        exporter.run_jobs()
+
+        self.assertEqual(
+            future.result(), './data/tiles/layer_1/{z}/{x}/{y}.png')
+        expected = list(tile_seeder.iter_tiles(extent, 0, 3))
+        self.assertEqual(len(StubWmsHandler.requests), len(expected))
+        for z, x, y in expected:
+            path = os.path.join(
+                self.data_dir, 'tiles', 'layer_1', str(z), str(x), '%d.png' % y)
+            self.assertTrue(os.path.exists(path), path)
+
+    def test_service_exception_fails_layer(self):
+        """An XML error document is not stored as a tile."""
+        exporter = data_exporter.DataExporter(
+            self.data_dir, export_options.ExportOptions(wms_tile_max_zoom=1))
+
+        future = tile_seeder.export_tile_pyramid(
+            exporter, 'broken', self.source('broken'), (0, 0, 1, 1))
+        exporter.run_jobs()
+
+        self.assertIsInstance(future.exception(), RuntimeError)
+
+    def test_failed_tile_stops_seeding(self):
+        """Tiles queued after the first failure are not fetched."""
+        exporter = data_exporter.DataExporter(
+            self.data_dir, export_options.ExportOptions(wms_tile_max_zoom=4))
+        world = (-tile_seeder.ORIGIN_SHIFT, -tile_seeder.ORIGIN_SHIFT,
+                 tile_seeder.ORIGIN_SHIFT, tile_seeder.ORIGIN_SHIFT)
+
+        future = tile_seeder.export_tile_pyramid(
+            exporter, 'broken', self.source('broken'), world)
+        exporter.run_jobs()
+
+        self.assertIsInstance(future.exception(), RuntimeError)
+        self.assertLess(
+            len(StubWmsHandler.requests),
+            tile_seeder.count_tiles(world, 0, 4))
+
+    def test_cancel(self):
+        """Seeding stops once the export is canceled."""
+        exporter = data_exporter.DataExporter(
+            self.data_dir, export_options.ExportOptions(wms_tile_max_zoom=4))
+        world = (-tile_seeder.ORIGIN_SHIFT, -tile_seeder.ORIGIN_SHIFT,
+                 tile_seeder.ORIGIN_SHIFT, tile_seeder.ORIGIN_SHIFT)
+        requests = StubWmsHandler.requests
+
+        future = tile_seeder.export_tile_pyramid(
+            exporter, 'roads', self.source('roads'), world)
+        # the only job is already running when the export gets canceled
+        with self.assertRaises(data_exporter.ExportCanceled):
+            exporter.run_jobs(is_canceled=lambda: len(requests) >= 10)
+
+        self.assertIsInstance(future.exception(), data_exporter.ExportCanceled)
+        self.assertLess(len(requests), tile_seeder.count_tiles(world, 0, 4))
+
+    def test_tile_limit(self):
+        """Seeding too many tiles is refused upfront."""
+        exporter = data_exporter.DataExporter(
+            self.data_dir, export_options.ExportOptions(
+                wms_tile_max_zoom=10, wms_tile_limit=5))
+
+        with self.assertRaises(ValueError):
+            tile_seeder.export_tile_pyramid(
+                exporter, 'roads', self.source('roads'), (0, 0, 1e6, 1e6))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TileSeederTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,137 @@
+# coding=utf-8
+"""Vector conversion test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'qgis@wiktor.latanowicz.com'
+__date__ = '2025-07-10'
+__copyright__ = 'Copyright 2025, Wiktor Lataowicz'
+
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from utilities import import_plugin_module
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+data_exporter = import_plugin_module('data_exporter')
+export_options = import_plugin_module('export_options')
+layer_source = import_plugin_module('layer_source')
+vector_exporter = import_plugin_module('vector_exporter') if gdal else None
+
+
+def write_roads(path, name='roads'):
+    """Write a GeoJSON layer of two lines."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        'type': 'FeatureCollection',
+        'name': name,
+        'features': [
+            {
+                'type': 'Feature',
+                'properties': {'name': 'road %d' % i},
+                'geometry': {
+                    'type': 'LineString',
+                    'coordinates': [[i, 0], [i + 0.5, 0.01], [i + 1, 0]],
+                },
+            }
+            for i in range(2)],
+    }))
+    return path
+
+
+def count_features(path):
+    dataset = gdal.OpenEx(str(path), gdal.OF_VECTOR)
+    return dataset.GetLayer(0).GetFeatureCount()
+
+
+@unittest.skipIf(gdal is None, 'GDAL Python bindings are not installed')
+class VectorExporterTest(unittest.TestCase):
+    """Test converting vector layers with GDAL."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.data_dir = self.temp_dir / 'data'
+        self.exporter = data_exporter.DataExporter(
+            str(self.data_dir), export_options.ExportOptions())
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_flatgeobuf(self):
+        """Sources of the same name get their own FlatGeobuf file."""
+        first = write_roads(self.temp_dir / 'a' / 'roads.geojson')
+        second = write_roads(self.temp_dir / 'b' / 'roads.geojson')
+
+        futures = [
+            vector_exporter.export_flatgeobuf(
+                self.exporter,
+                layer_source.parse_layer_source('ogr', str(path)))
+            for path in (first, second)]
+        self.exporter.run_jobs()
+
+        for path, future in zip((first, second), futures):
+            name = 'roads.%s.fgb' % vector_exporter.path_hash(path)
+            self.assertEqual(future.result(), './data/' + name)
+            self.assertEqual(count_features(self.data_dir / name), 2)
+
+    def test_flatgeobuf_layer_name(self):
+        """The layer name is part of the file name, made safe for URLs."""
+        path = write_roads(self.temp_dir / 'roads.geojson', 'main roads/1')
+
+        future = vector_exporter.export_flatgeobuf(
+            self.exporter,
+            layer_source.parse_layer_source(
+                'ogr', '%s|layername=main roads/1' % path))
+        self.exporter.run_jobs()
+
+        name = 'roads.%s.main_roads_1.fgb' % vector_exporter.path_hash(path)
+        self.assertEqual(future.result(), './data/' + name)
+        self.assertEqual(count_features(self.data_dir / name), 2)
+
+    def test_lods(self):
+        """Zoom bands follow each other, each has its simplified copy."""
+        path = write_roads(self.temp_dir / 'roads.geojson')
+
+        lods = vector_exporter.export_lods(
+            self.exporter, str(path), [4, 10], geographic=True)
+        self.exporter.run_jobs()
+
+        digest = vector_exporter.path_hash(path)
+        self.assertEqual(
+            [(lod['minZoom'], lod['maxZoom'], lod['url'].result())
+             for lod in lods],
+            [(0, 4, './data/lod/roads.%s.z4.geojson' % digest),
+             (5, 10, './data/lod/roads.%s.z10.geojson' % digest)])
+        for lod in lods:
+            simplified = self.data_dir / lod['url'].result()[len('./data/'):]
+            self.assertEqual(count_features(simplified), 2)
+
+        # a pixel at zoom 4 flattens the bend of the roads, at zoom 10 not
+        def num_points(max_zoom):
+            with open(self.data_dir / 'lod' / (
+                    'roads.%s.z%d.geojson' % (digest, max_zoom))) as fp:
+                features = json.load(fp)['features']
+            return len(features[0]['geometry']['coordinates'])
+
+        self.assertEqual(num_points(4), 2)
+        self.assertEqual(num_points(10), 3)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VectorExporterTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,94 @@
+# coding=utf-8
+"""Vector tile export test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'qgis@wiktor.latanowicz.com'
+__date__ = '2025-07-10'
+__copyright__ = 'Copyright 2025, Wiktor Lataowicz'
+
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from qgis.core import QgsCoordinateTransformContext
+
+from utilities import get_qgis_app, import_plugin_module
+QGIS_APP = get_qgis_app()
+
+data_exporter = import_plugin_module('data_exporter')
+export_options = import_plugin_module('export_options')
+layer_source = import_plugin_module('layer_source')
+vector_tile_exporter = import_plugin_module('vector_tile_exporter')
+
+
+class VectorTileExporterTest(unittest.TestCase):
+    """Test tiling vector layers into Mapbox Vector Tiles."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.data_dir = self.temp_dir / 'data'
+        path = self.temp_dir / 'roads.geojson'
+        # a line across the world touches tiles at every zoom level
+        path.write_text(json.dumps({
+            'type': 'FeatureCollection',
+            'features': [{
+                'type': 'Feature',
+                'properties': {'name': 'equator'},
+                'geometry': {
+                    'type': 'LineString',
+                    'coordinates': [[-179, 1], [179, 1]],
+                },
+            }],
+        }))
+        self.source = layer_source.parse_layer_source('ogr', str(path))
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.temp_dir)
+
+    def export(self, is_canceled=None):
+        exporter = data_exporter.DataExporter(
+            str(self.data_dir),
+            export_options.ExportOptions(vector_tile_max_zoom=4))
+        future = vector_tile_exporter.export_vector_tiles(
+            exporter, 'layer 1', self.source, 'roads',
+            QgsCoordinateTransformContext())
+        exporter.run_jobs(is_canceled=is_canceled)
+        return future
+
+    def test_tiles(self):
+        """Tiles of every zoom level are written under the layer's name."""
+        future = self.export()
+
+        self.assertEqual(
+            future.result(), './data/tiles/layer_1/{z}/{x}/{y}.pbf')
+        tiles_dir = self.data_dir / 'tiles' / 'layer_1'
+        self.assertTrue((tiles_dir / '0' / '0' / '0.pbf').exists())
+        self.assertTrue(any((tiles_dir / '4').rglob('*.pbf')))
+
+    def test_cancel(self):
+        """Tiling stops once the export is canceled."""
+        checks = []
+
+        def is_canceled():
+            # the first check happens before the job starts
+            checks.append(True)
+            return len(checks) > 1
+
+        with self.assertRaises(data_exporter.ExportCanceled):
+            self.export(is_canceled)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VectorTileExporterTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
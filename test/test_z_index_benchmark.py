@@ -0,0 +1,85 @@
+# coding=utf-8
+"""Z-index computation benchmark.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'qgis@wiktor.latanowicz.com'
+__date__ = '2025-07-10'
+__copyright__ = 'Copyright 2025, Wiktor Lataowicz'
+
+import time
+import unittest
+from itertools import count
+
+from qgis.core import QgsProject
+
+from utilities import (
+    BENCHMARK, get_qgis_app, import_plugin_module, create_memory_layers)
+QGIS_APP = get_qgis_app()
+
+layer_exporter = import_plugin_module('layer_exporter')
+
+
+class CountingRoot:
+    """Layer tree root counting how often the layer order is read."""
+
+    def __init__(self, root):
+        self.root = root
+        self.layer_order_calls = 0
+
+    def layerOrder(self):
+        self.layer_order_calls += 1
+        return self.root.layerOrder()
+
+
+def time_z_indexes(num_layers):
+    """Return the time needed to compute z-indexes of num_layers layers.
+
+    Also returns the z-indexes and how often the layer order was read.
+    """
+    project = QgsProject()
+    create_memory_layers(project, num_layers)
+    root = CountingRoot(project.layerTreeRoot())
+    exporter = layer_exporter.LayerExporter(root, count(), None)
+    nodes = root.root.findLayers()
+
+    start = time.perf_counter()
+    z_indexes = [exporter.determine_z_index(node) for node in nodes]
+    elapsed = time.perf_counter() - start
+
+    project.clear()
+    return elapsed, z_indexes, root.layer_order_calls
+
+
+class ZIndexBenchmarkTest(unittest.TestCase):
+    """Test z-index computation scales linearly with the number of layers."""
+
+    def test_z_indexes_follow_layer_order(self):
+        """Top layer gets the highest z-index."""
+        _, z_indexes, _ = time_z_indexes(5)
+        self.assertEqual(z_indexes, [50, 40, 30, 20, 10])
+
+    def test_layer_order_is_read_once(self):
+        """The layer order is read once, not once per layer."""
+        _, z_indexes, layer_order_calls = time_z_indexes(1000)
+        self.assertEqual(len(z_indexes), 1000)
+        self.assertEqual(layer_order_calls, 1)
+
+    @unittest.skipUnless(BENCHMARK, 'set QGIS_OL_MAP_BENCHMARK=1 to run')
+    def test_z_index_scales_linearly(self):
+        """Quadrupling the number of layers does not take 16 times longer."""
+        small, _, _ = time_z_indexes(1000)
+        large, _, _ = time_z_indexes(4000)
+        # linear growth would be 4x, allow generous noise
+        self.assertLess(large, small * 8)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ZIndexBenchmarkTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
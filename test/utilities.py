@@ -1,6 +1,7 @@
 # coding=utf-8
 """Common functionality used by regression tests."""
 
+import os
 import sys
 import logging
 
@@ -59,3 +60,172 @@ def get_qgis_app():
         IFACE = QgisInterface(CANVAS)
 
     return QGIS_APP, CANVAS, IFACE, PARENT
+
+
+PLUGIN_PACKAGE = 'qgis_ol_map_plugin'
+
+
+def import_plugin_module(name):
+    """Import a plugin module which uses package relative imports.
+
+    The plugin directory is registered as the PLUGIN_PACKAGE package the
+    first time this is called.
+
+    :param name: Name of the module inside the plugin, e.g. 'layer_exporter'.
+    :type name: str
+
+    :returns: The imported module.
+    """
+    import importlib
+    import importlib.util
+    import os
+
+    if PLUGIN_PACKAGE not in sys.modules:
+        plugin_dir = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), os.pardir))
+        spec = importlib.util.spec_from_file_location(
+            PLUGIN_PACKAGE,
+            os.path.join(plugin_dir, '__init__.py'),
+            submodule_search_locations=[plugin_dir])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[PLUGIN_PACKAGE] = package
+        spec.loader.exec_module(package)
+
+    return importlib.import_module('%s.%s' % (PLUGIN_PACKAGE, name))
+
+
+# wall clock comparisons within a run are noisy on shared machines, the
+# benchmarks making them only run when QGIS_OL_MAP_BENCHMARK is set
+BENCHMARK = import_plugin_module('environment').to_bool(
+    os.environ.get('QGIS_OL_MAP_BENCHMARK', 'false'))
+
+
+def create_memory_layers(project, count, group=None):
+    """Add synthetic point layers to a project.
+
+    :param project: Project the layers are added to.
+    :type project: QgsProject
+
+    :param count: Number of layers to create.
+    :type count: int
+
+    :param group: Layer tree group to put the layers in. Defaults to the
+        root of the project layer tree.
+    :type group: QgsLayerTreeGroup
+
+    :returns: The created layers.
+    :rtype: list
+    """
+    from qgis.core import QgsVectorLayer
+
+    layers = [
+        QgsVectorLayer('Point?crs=EPSG:4326', 'layer %d' % i, 'memory')
+        for i in range(count)]
+    project.addMapLayers(layers, group is None)
+    if group is not None:
+        for layer in layers:
+            group.addLayer(layer)
+    return layers
+
+
+def write_geojson(path, num_features):
+    """Write a FeatureCollection of num_features points to path.
+
+    :returns: The path.
+    :rtype: str
+    """
+    import json
+
+    features = [
+        {
+            'type': 'Feature',
+            'properties': {'id': i, 'kind': 'kind %d' % (i % 50)},
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [(i % 3600) / 10.0 - 180, (i % 1700) / 10.0 - 85],
+            },
+        }
+        for i in range(num_features)]
+    with open(path, 'w') as fp:
+        json.dump({'type': 'FeatureCollection', 'features': features}, fp)
+    return path
+
+
+def write_geotiff(path, size):
+    """Write a single band size x size GeoTIFF covering the world to path.
+
+    :returns: The path.
+    :rtype: str
+    """
+    from osgeo import gdal, osr
+
+    dataset = gdal.GetDriverByName('GTiff').Create(
+        path, size, size, 1, gdal.GDT_Byte)
+    dataset.SetGeoTransform([-180, 360.0 / size, 0, 90, 0, -180.0 / size])
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    dataset.SetProjection(srs.ExportToWkt())
+    band = dataset.GetRasterBand(1)
+    band.WriteRaster(0, 0, size, size, bytes(i % 256 for i in range(size)) * size)
+    dataset = None
+    return path
+
+
+def set_categorized_style(layer, num_categories):
+    """Give a vector layer a categorized renderer with heavy style XML."""
+    from qgis.core import (
+        QgsCategorizedSymbolRenderer, QgsRendererCategory, QgsSymbol)
+
+    categories = []
+    for i in range(num_categories):
+        symbol = QgsSymbol.defaultSymbol(layer.geometryType())
+        categories.append(
+            QgsRendererCategory('kind %d' % i, symbol, 'kind %d' % i))
+    layer.setRenderer(QgsCategorizedSymbolRenderer('kind', categories))
+
+
+def create_synthetic_project(
+        project, data_dir, num_layers, depth=1, num_features=100,
+        raster_size=256, num_categories=1):
+    """Add file based layers in nested groups to a project.
+
+    Every fourth layer is a GeoTIFF, the others are GeoJSON files with a
+    categorized style. The layers are spread over depth nested groups.
+
+    :param project: Project the layers are added to.
+    :type project: QgsProject
+
+    :param data_dir: Directory the layer files are written to.
+    :type data_dir: str
+
+    :returns: The created layers.
+    :rtype: list
+    """
+    import os
+    from qgis.core import QgsRasterLayer, QgsVectorLayer
+
+    groups = [project.layerTreeRoot()]
+    for level in range(depth):
+        groups.append(groups[-1].addGroup('group %d' % level))
+
+    geojson_path = write_geojson(
+        os.path.join(data_dir, 'points.geojson'), num_features)
+    geotiff_path = write_geotiff(
+        os.path.join(data_dir, 'raster.tif'), raster_size)
+
+    layers = []
+    for i in range(num_layers):
+        # distinct files, so that every layer exports its own data
+        if i % 4 == 3:
+            path = os.path.join(data_dir, 'raster-%d.tif' % i)
+            os.link(geotiff_path, path)
+            layer = QgsRasterLayer(path, 'raster %d' % i, 'gdal')
+        else:
+            path = os.path.join(data_dir, 'points-%d.geojson' % i)
+            os.link(geojson_path, path)
+            layer = QgsVectorLayer(path, 'points %d' % i, 'ogr')
+            set_categorized_style(layer, num_categories)
+        project.addMapLayer(layer, False)
+        groups[i % len(groups)].addLayer(layer)
+        layers.append(layer)
+    return layers
@@ -0,0 +1,232 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import partial
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterator, Mapping, Optional
+from urllib.parse import urlencode, urlsplit
+import math
+import re
+import shutil
+import threading
+from .data_exporter import CancelCallback, DataExporter, ExportCanceled
+from .layer_source import LayerSource
+
+# half of the EPSG:3857 world width, in meters
+ORIGIN_SHIFT = math.pi * 6378137
+TILE_SIZE = 256
+
+TileCoords = tuple[int, int, int]
+Extent = tuple[float, float, float, float]
+
+FORMAT_EXTENSIONS = {
+    "image/png": "png",
+    "image/png8": "png",
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/webp": "webp",
+}
+
+
+def tile_extent(z: int, x: int, y: int) -> Extent:
+    """EPSG:3857 bounds of an XYZ tile (y grows southwards)."""
+    size = 2 * ORIGIN_SHIFT / (1 << z)
+    xmin = -ORIGIN_SHIFT + x * size
+    ymax = ORIGIN_SHIFT - y * size
+    return (xmin, ymax - size, xmin + size, ymax)
+
+
+def tile_range(extent: Extent, z: int) -> tuple[range, range]:
+    """Columns and rows of the tiles at zoom z covering an EPSG:3857 extent."""
+    count = 1 << z
+    size = 2 * ORIGIN_SHIFT / count
+    xmin, ymin, xmax, ymax = extent
+
+    def clamp(value: float) -> int:
+        return min(max(int(value), 0), count - 1)
+
+    columns = range(clamp((xmin + ORIGIN_SHIFT) / size), clamp((xmax + ORIGIN_SHIFT) / size) + 1)
+    rows = range(clamp((ORIGIN_SHIFT - ymax) / size), clamp((ORIGIN_SHIFT - ymin) / size) + 1)
+    return columns, rows
+
+
+def count_tiles(extent: Extent, min_zoom: int, max_zoom: int) -> int:
+    total = 0
+    for z in range(min_zoom, max_zoom + 1):
+        columns, rows = tile_range(extent, z)
+        total += len(columns) * len(rows)
+    return total
+
+
+def iter_tiles(extent: Extent, min_zoom: int, max_zoom: int) -> Iterator[TileCoords]:
+    for z in range(min_zoom, max_zoom + 1):
+        columns, rows = tile_range(extent, z)
+        for x in columns:
+            for y in rows:
+                yield z, x, y
+
+
+def wms_tile_url(url: str, params: Mapping[str, str], z: int, x: int, y: int) -> str:
+    query = {
+        "SERVICE": "WMS",
+        "VERSION": "1.3.0",
+        "REQUEST": "GetMap",
+        "LAYERS": params["layers"],
+        "STYLES": params.get("styles", ""),
+        "FORMAT": params["format"],
+        "TRANSPARENT": "TRUE",
+        "CRS": "EPSG:3857",
+        "BBOX": ",".join(repr(value) for value in tile_extent(z, x, y)),
+        "WIDTH": TILE_SIZE,
+        "HEIGHT": TILE_SIZE,
+    }
+    return url.split("?")[0] + "?" + urlencode(query)
+
+
+def wmts_tile_url(url: str, params: Mapping[str, str], z: int, x: int, y: int) -> str:
+    """KVP GetTile URL, assuming a GoogleMapsCompatible tile matrix set
+    whose tile matrices are identified by the zoom level."""
+    query = {
+        "SERVICE": "WMTS",
+        "VERSION": "1.0.0",
+        "REQUEST": "GetTile",
+        "LAYER": params["layers"],
+        "STYLE": params.get("styles", ""),
+        "FORMAT": params["format"],
+        "TILEMATRIXSET": params["tileMatrixSet"],
+        "TILEMATRIX": z,
+        "TILEROW": y,
+        "TILECOL": x,
+    }
+    return url.split("?")[0] + "?" + urlencode(query)
+
+
+class ConnectionPool:
+    """Keeps one persistent HTTP connection per host and thread.
+
+    The number of open connections is bounded by the number of threads
+    using the pool.
+    """
+
+    def __init__(self, timeout: float = 30) -> None:
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self, scheme: str, netloc: str, fresh: bool = False) -> HTTPConnection:
+        connections = self.local.__dict__.setdefault("connections", {})
+        key = (scheme, netloc)
+        if fresh and key in connections:
+            connections.pop(key).close()
+        if key not in connections:
+            connection_class = HTTPSConnection if scheme == "https" else HTTPConnection
+            connections[key] = connection_class(netloc, timeout=self.timeout)
+        return connections[key]
+
+    def get(self, url: str) -> tuple[int, str, bytes]:
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        # a kept-alive connection may have been closed by the server meanwhile
+        for fresh in (False, True):
+            connection = self.connection(parts.scheme, parts.netloc, fresh)
+            try:
+                connection.request("GET", path, headers={"User-Agent": "qgis-ol-map"})
+                response = connection.getresponse()
+                return response.status, response.getheader("Content-Type", ""), response.read()
+            except (HTTPException, ConnectionError):
+                if fresh:
+                    raise
+        raise AssertionError("unreachable")
+
+
+def fetch_tile(pool: ConnectionPool, tile_url: Callable[[int, int, int], str], target_dir: Path, extension: str, tile: TileCoords) -> int:
+    z, x, y = tile
+    url = tile_url(z, x, y)
+    status, content_type, body = pool.get(url)
+    if status != 200 or not content_type.startswith("image/"):
+        # WMS servers report errors as XML documents, often with status 200
+        raise RuntimeError(f"Cannot fetch tile {url}: {status} {body[:200]!r}")
+
+    path = target_dir / str(z) / str(x) / f"{y}.{extension}"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(body)
+    return len(body)
+
+
+def seed_tiles(
+    tile_url: Callable[[int, int, int], str],
+    extent: Extent,
+    min_zoom: int,
+    max_zoom: int,
+    target_dir: Path,
+    extension: str,
+    workers: int,
+    is_canceled: Optional[CancelCallback] = None,
+) -> int:
+    """Downloads an XYZ tile pyramid covering extent into target_dir.
+
+    At most two tiles per worker are queued. Seeding stops at the first
+    failed tile, raising its error, and raises ExportCanceled once
+    is_canceled returns True. Returns the number of downloaded bytes.
+    """
+    if target_dir.exists():
+        shutil.rmtree(target_dir)
+    target_dir.mkdir(parents=True)
+
+    pool = ConnectionPool()
+    tiles = iter_tiles(extent, min_zoom, max_zoom)
+
+    def fetch(tile: TileCoords) -> int:
+        return fetch_tile(pool, tile_url, target_dir, extension, tile)
+
+    total = 0
+    pending: set[Future] = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while True:
+                if is_canceled is not None and is_canceled():
+                    raise ExportCanceled()
+                for tile in islice(tiles, 2 * workers - len(pending)):
+                    pending.add(executor.submit(fetch, tile))
+                if not pending:
+                    return total
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    total += future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+TILE_URL_BUILDERS = {
+    "wms": wms_tile_url,
+    "wmts": wmts_tile_url,
+}
+
+
+def export_tile_pyramid(data_exporter: DataExporter, name: str, source: LayerSource, extent: Extent) -> Future:
+    """Schedules seeding of a WMS or WMTS layer into data/tiles/<name>/."""
+    options = data_exporter.options
+    min_zoom, max_zoom = options.wms_tile_min_zoom, options.wms_tile_max_zoom
+
+    num_tiles = count_tiles(extent, min_zoom, max_zoom)
+    if num_tiles > options.wms_tile_limit:
+        raise ValueError(
+            f"Seeding would fetch {num_tiles} tiles, more than wms_tile_limit ({options.wms_tile_limit})"
+        )
+
+    directory = re.sub(r"[^\w.-]", "_", name)
+    extension = FORMAT_EXTENSIONS.get(source.params["format"].lower(), "png")
+    target = data_exporter.data_path("tiles", directory)
+    tile_url = partial(TILE_URL_BUILDERS[source.kind], source.url, source.params)
+
+    def seed() -> str:
+        size = seed_tiles(
+            tile_url, extent, min_zoom, max_zoom, target, extension, options.wms_tile_workers, data_exporter.canceled
+        )
+        data_exporter.stats.add_copied(size)
+        return f"./data/tiles/{directory}/{{z}}/{{x}}/{{y}}.{extension}"
+
+    return data_exporter.schedule(source.uri, target, seed)
@@ -0,0 +1,201 @@
+from concurrent.futures import Future
+from functools import partial
+from pathlib import Path
+from typing import Any, Optional
+import hashlib
+import os
+import re
+from osgeo import gdal, osr
+from .data_exporter import DataExporter
+from .geojson_exporter import PointsTransform, Reprojection, zoom_resolution
+from .layer_source import LayerSource
+
+OGR_DRIVERS = {
+    ".geojson": "GeoJSON",
+    ".kml": "KML",
+    ".gpx": "GPX",
+}
+
+# route_points and track_points repeat the vertices of routes and tracks,
+# written back they would turn into waypoints
+GPX_LAYERS = ["waypoints", "routes", "tracks"]
+
+# formats holding a single layer per file
+SINGLE_LAYER_FORMATS = {"FlatGeobuf"}
+
+# hex digits of the source path hash in names of derived files
+PATH_HASH_LENGTH = 8
+
+
+def path_hash(path: Path) -> str:
+    """Short hash of the absolute path, telling apart sources of the same name."""
+    return hashlib.sha1(str(path.absolute()).encode("utf-8")).hexdigest()[:PATH_HASH_LENGTH]
+
+
+def first_gpx_layer(source: Path) -> str:
+    """The first of GPX_LAYERS with features, waypoints of an empty file."""
+    dataset = gdal.OpenEx(str(source), gdal.OF_VECTOR)
+    if dataset is None:
+        raise RuntimeError(f"Cannot open {source}: {gdal.GetLastErrorMsg()}")
+    for name in GPX_LAYERS:
+        layer = dataset.GetLayerByName(name)
+        if layer is not None and layer.GetFeatureCount() > 0:
+            return name
+    return GPX_LAYERS[0]
+
+
+def translate_vector(options: dict[str, Any], source: Path, target: Path) -> None:
+    """Converts a vector dataset with ogr2ogr options, into the format of source
+    unless options say otherwise."""
+    options = dict(options)
+    options.setdefault("format", OGR_DRIVERS[source.suffix.lower()])
+    if source.suffix.lower() == ".gpx" and "layers" not in options:
+        options["layers"] = [first_gpx_layer(source)] if options["format"] in SINGLE_LAYER_FORMATS else GPX_LAYERS
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # keeps the suffix, drivers like FlatGeobuf pick the layout by it
+    tmp_path = target.with_name(f"{target.stem}.tmp{target.suffix}")
+    dataset = gdal.VectorTranslate(str(tmp_path), str(source), **options)
+    if dataset is None:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise RuntimeError(f"Cannot convert {source}: {gdal.GetLastErrorMsg()}")
+    # closes the dataset, flushing it to disk
+    dataset = None
+
+    if target.is_symlink() or target.exists():
+        target.unlink()
+    os.replace(tmp_path, target)
+
+
+def spatial_reference(crs: str) -> osr.SpatialReference:
+    """Spatial reference of an authid or WKT, with x/y axis order."""
+    reference = osr.SpatialReference()
+    if reference.SetFromUserInput(crs) != 0:
+        raise ValueError(f"Unknown CRS: {crs}")
+    reference.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return reference
+
+
+def points_transform(source_crs: str, target_crs: str) -> PointsTransform:
+    """Transforms lists of points with a single call into PROJ each."""
+    transformation = osr.CoordinateTransformation(spatial_reference(source_crs), spatial_reference(target_crs))
+
+    def transform(points: list[tuple[float, float]]) -> list[tuple[float, float]]:
+        return [(x, y) for x, y, *_ in transformation.TransformPoints(points)]
+
+    return transform
+
+
+def create_reprojection(source_crs: str, target_crs: str) -> Reprojection:
+    return Reprojection(source_crs, target_crs, partial(points_transform, source_crs, target_crs))
+
+
+def reprojection_options(reprojection: Optional[Reprojection]) -> dict[str, Any]:
+    """ogr2ogr options applying reprojection."""
+    if reprojection is None:
+        return {}
+    return {"srcSRS": reprojection.source_crs, "dstSRS": reprojection.crs}
+
+
+def export_reprojected(data_exporter: DataExporter, url: str, reprojection: Reprojection) -> Future:
+    """Schedules a copy of a vector dataset reprojected to reprojection.crs."""
+    source = Path(url)
+
+    return data_exporter.export_data(
+        source,
+        data_exporter.data_path(source.name),
+        "./data/" + source.name,
+        partial(translate_vector, reprojection_options(reprojection)),
+        crs=reprojection.crs,
+    )
+
+
+def export_simplified(
+    data_exporter: DataExporter,
+    url: str,
+    max_zoom: int,
+    tolerance: float,
+    reprojection: Optional[Reprojection] = None,
+) -> Future:
+    """Schedules a copy of a vector dataset simplified for zooms up to max_zoom.
+
+    ogr2ogr -simplify preserves the topology of every feature, e.g. polygons
+    stay valid, but not between features. tolerance is in units of the
+    source, simplification happens before reprojection.
+    """
+    source = Path(url)
+    name = f"{source.stem}.{path_hash(source)}.z{max_zoom}{source.suffix}"
+    settings: dict[str, Any] = {"tolerance": tolerance}
+    if reprojection is not None:
+        settings["crs"] = reprojection.crs
+
+    return data_exporter.export_data(
+        source,
+        data_exporter.data_path("lod", name),
+        "./data/lod/" + name,
+        partial(translate_vector, {"simplifyTolerance": tolerance, **reprojection_options(reprojection)}),
+        **settings,
+    )
+
+
+def export_lods(
+    data_exporter: DataExporter,
+    url: str,
+    max_zooms: list[int],
+    geographic: bool,
+    reprojection: Optional[Reprojection] = None,
+) -> list[dict[str, Any]]:
+    """Schedules simplified copies of a vector dataset, one per zoom band.
+
+    Bands end at max_zooms, every one starts after the previous. A band is
+    simplified to a pixel at its maximum zoom.
+    """
+    lods = []
+    min_zoom = 0
+    for max_zoom in max_zooms:
+        tolerance = zoom_resolution(max_zoom, geographic)
+        lods.append({
+            "minZoom": min_zoom,
+            "maxZoom": max_zoom,
+            "url": export_simplified(data_exporter, url, max_zoom, tolerance, reprojection),
+        })
+        min_zoom = max_zoom + 1
+    return lods
+
+
+def export_flatgeobuf(
+    data_exporter: DataExporter,
+    source: LayerSource,
+    reprojection: Optional[Reprojection] = None,
+) -> Future:
+    """Schedules conversion of a vector layer to FlatGeobuf with a spatial index.
+
+    FlatGeobuf holds a single layer, so the layer of a multi layer source
+    (e.g. GPX tracks) is converted on its own. GPX sources not naming a
+    layer convert their first non-empty one.
+    """
+    source_path = Path(source.path)
+    layer_name = source.params.get("layername")
+    stem = f"{source_path.stem}.{path_hash(source_path)}"
+    if layer_name:
+        stem += "." + re.sub(r"[^\w.-]", "_", layer_name)
+    options: dict[str, Any] = {
+        "format": "FlatGeobuf",
+        "layerCreationOptions": ["SPATIAL_INDEX=YES"],
+        **reprojection_options(reprojection),
+    }
+    if layer_name:
+        options["layers"] = [layer_name]
+
+    settings: dict[str, Any] = {"format": "flatgeobuf", "layer": layer_name}
+    if reprojection is not None:
+        settings["crs"] = reprojection.crs
+
+    return data_exporter.export_data(
+        source_path,
+        data_exporter.data_path(stem + ".fgb"),
+        f"./data/{stem}.fgb",
+        partial(translate_vector, options),
+        **settings,
+    )
@@ -0,0 +1,107 @@
+from qgis.core import (
+    QgsCoordinateTransformContext,
+    QgsFeedback,
+    QgsVectorLayer,
+    QgsVectorTileWriter,
+)
+from qgis.PyQt.QtCore import QUrl
+from concurrent.futures import Future
+from functools import partial
+from pathlib import Path
+import re
+import shutil
+from .data_exporter import CancelCallback, DataExporter, ExportCanceled
+from .layer_source import LayerSource
+
+TILE_TEMPLATE = "{z}/{x}/{y}.pbf"
+
+
+def write_vector_tiles(
+    source: LayerSource,
+    layer_name: str,
+    min_zoom: int,
+    max_zoom: int,
+    transform_context: QgsCoordinateTransformContext,
+    is_canceled: CancelCallback,
+    _source_path: Path,
+    target: Path,
+) -> None:
+    """Writes a z/x/y Mapbox Vector Tile pyramid of a vector data source.
+
+    Runs in an export worker thread, so a private layer is opened instead of
+    touching the one in the project. The MVT encoder snaps geometries to the
+    tile grid of each zoom level, dropping vertices finer than a tile pixel.
+    Raises ExportCanceled once is_canceled returns True, checked whenever
+    the writer reports progress.
+    """
+    layer = QgsVectorLayer(source.uri, layer_name, source.provider)
+    if not layer.isValid():
+        raise ValueError(f"Cannot open {source.uri}")
+
+    if target.exists():
+        shutil.rmtree(target)
+    target.mkdir(parents=True)
+
+    writer = QgsVectorTileWriter()
+    writer.setDestinationUri(
+        "type=xyz&url=" + QUrl.fromLocalFile(str(target)).toString() + "/" + TILE_TEMPLATE
+    )
+    writer.setMinZoom(min_zoom)
+    writer.setMaxZoom(max_zoom)
+    writer.setTransformContext(transform_context)
+
+    tile_layer = QgsVectorTileWriter.Layer(layer)
+    tile_layer.setLayerName(layer_name)
+    writer.setLayers([tile_layer])
+
+    feedback = QgsFeedback()
+
+    def cancel_if_requested(_progress: float) -> None:
+        if is_canceled():
+            feedback.cancel()
+
+    # emitted on this thread, from within writeTiles()
+    feedback.progressChanged.connect(cancel_if_requested)
+    written = writer.writeTiles(feedback)
+    if is_canceled():
+        raise ExportCanceled()
+    if not written:
+        raise RuntimeError(writer.errorMessage())
+
+
+def export_vector_tiles(
+    data_exporter: DataExporter,
+    name: str,
+    source: LayerSource,
+    layer_name: str,
+    transform_context: QgsCoordinateTransformContext,
+) -> Future:
+    """Schedules tiling of a vector layer into data/tiles/<name>/.
+
+    name has to be unique per layer, e.g. its id, since sources of
+    different layers may share the file name. transform_context is the
+    one of the layer's project, read on the main thread.
+    """
+    options = data_exporter.options
+    source_path = Path(source.path)
+    directory = re.sub(r"[^\w.-]", "_", name)
+    target = data_exporter.data_path("tiles", directory)
+    url = f"./data/tiles/{directory}/{TILE_TEMPLATE}"
+
+    return data_exporter.export_data(
+        source_path,
+        target,
+        url,
+        partial(
+            write_vector_tiles,
+            source,
+            layer_name,
+            options.vector_tile_min_zoom,
+            options.vector_tile_max_zoom,
+            transform_context,
+            data_exporter.canceled,
+        ),
+        uri=source.uri,
+        min_zoom=options.vector_tile_min_zoom,
+        max_zoom=options.vector_tile_max_zoom,
+    )
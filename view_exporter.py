@@ -1,6 +1,53 @@
-from qgis.core import QgsCoordinateTransform, QgsCoordinateReferenceSystem, QgsProject
+from qgis.core import (
+    QgsCoordinateTransform,
+    QgsCoordinateReferenceSystem,
+    QgsCsException,
+    QgsPointXY,
+    QgsProject,
+    QgsRectangle,
+    QgsScaleCalculator,
+)
 
 from qgis.gui import QgsMapCanvas
+import logging
+import math
+from .tile_seeder import ORIGIN_SHIFT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DPI = 96
+
+# latitude where the square EPSG:3857 world ends
+MAX_LATITUDE = 85.0511287798
+
+
+class StaticViewport:
+    """Stands in for QgsMapCanvas where there is no canvas, e.g. in headless exports.
+
+    Implements the part of the canvas API used by the exporters, the extent
+    is in the project CRS.
+    """
+
+    def __init__(self, extent: QgsRectangle, scale: float) -> None:
+        self._extent = QgsRectangle(extent)
+        self._scale = scale
+
+    @classmethod
+    def fit(cls, qgis_instance: QgsProject, extent: QgsRectangle, width: int, dpi: int = DEFAULT_DPI) -> "StaticViewport":
+        """Viewport showing extent on a map width pixels wide."""
+        calculator = QgsScaleCalculator()
+        calculator.setDpi(dpi)
+        calculator.setMapUnits(qgis_instance.crs().mapUnits())
+        return cls(extent, calculator.calculate(extent, width))
+
+    def center(self) -> QgsPointXY:
+        return self._extent.center()
+
+    def extent(self) -> QgsRectangle:
+        return QgsRectangle(self._extent)
+
+    def scale(self) -> float:
+        return self._scale
 
 
 def extract_center(qgis_instance, map_canvas: QgsMapCanvas):
@@ -19,6 +66,33 @@ def extract_center(qgis_instance, map_canvas: QgsMapCanvas):
     }
 
 
+def extract_extent(qgis_instance, map_canvas: QgsMapCanvas) -> tuple[float, float, float, float]:
+    """Converts the visible extent to EPSG:3857, clamped to the area EPSG:3857 covers.
+
+    Goes through EPSG:4326, so that world or polar extents are clamped
+    before they reach the poles. Falls back to the whole world when the
+    extent cannot be transformed.
+    """
+    world = (-ORIGIN_SHIFT, -ORIGIN_SHIFT, ORIGIN_SHIFT, ORIGIN_SHIFT)
+    wgs84 = QgsCoordinateReferenceSystem("EPSG:4326")
+    try:
+        extent = QgsCoordinateTransform(qgis_instance.crs(), wgs84, qgis_instance).transformBoundingBox(map_canvas.extent())
+        extent = extent.intersect(QgsRectangle(-180, -MAX_LATITUDE, 180, MAX_LATITUDE))
+        if extent.isNull():
+            return world
+        extent = QgsCoordinateTransform(
+            wgs84, QgsCoordinateReferenceSystem("EPSG:3857"), qgis_instance
+        ).transformBoundingBox(extent)
+    except QgsCsException:
+        logger.warning("Cannot transform the map extent to EPSG:3857, using the whole world", exc_info=True)
+        return world
+
+    bounds = (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum())
+    if not all(math.isfinite(value) for value in bounds):
+        return world
+    return tuple(min(max(value, -ORIGIN_SHIFT), ORIGIN_SHIFT) for value in bounds)
+
+
 def scale_to_zoom(scale: float) -> int:
     # source https://wiki.openstreetmap.org/wiki/Zoom_levels
     scale_to_zoom: dict[int, int] = {